@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+"""
+Time id() lookups for every same-page link in each document, the way a query like
+
+    for $r in //a/@href return id(substring-after($r, "#"))
+
+performs them, using the per-document ID index against the walk over every descendant of the root tag that it
+replaced. The walk is quadratic across a page, so it only runs for a sample of the links and both are reported per
+lookup. Both must find the same elements; the script stops if they don't. The full query is timed as well.
+
+Usage: python benchmarks/bench_id_lookup.py [<file.html>...]
+"""
+
+import sys
+
+from corpus import best_of, load_corpus
+
+from hq.hquery.hquery_processor import HqueryProcessor
+from hq.soup_util import make_soup, id_index, is_tag_node, root_tag_from_any_tag, soup_from_any_tag
+
+
+SAMPLE_STRIDE = 50
+QUERY = 'for $r in //a/@href return id(substring-after($r, "#"))'
+
+
+def walking_id_lookup(context_node, value):
+    return [node for node in root_tag_from_any_tag(context_node).descendants
+            if is_tag_node(node) and 'id' in node.attrs and node['id'] == value]
+
+
+def indexed_id_lookup(context_node, value):
+    return list(id_index(soup_from_any_tag(context_node)).get(value, ()))
+
+
+def main():
+    corpus = load_corpus(sys.argv[1:], rows=5000)
+    soups = [make_soup(source) for _, source in corpus]
+    lookups = [(a, a['href'][1:]) for soup in soups for a in soup.find_all('a', href=True) if a['href'][:1] == '#']
+    print('Corpus: {0} document(s), {1} same-page links'.format(len(soups), len(lookups)))
+
+    sample = lookups[::SAMPLE_STRIDE]
+    for node, value in sample:
+        if [id(n) for n in walking_id_lookup(node, value)] != [id(n) for n in indexed_id_lookup(node, value)]:
+            sys.exit('MISMATCH looking up id "{0}"'.format(value))
+
+    before = best_of(1, lambda: [walking_id_lookup(node, value) for node, value in sample]) / len(sample)
+    after = best_of(3, lambda: [indexed_id_lookup(node, value) for node, value in lookups]) / len(lookups)
+    print('{0:<18} {1:>12.3f} ms per lookup'.format('walking', before * 1000))
+    print('{0:<18} {1:>12.3f} ms per lookup  ({2:.0f}x)'.format('indexed', after * 1000, before / after))
+
+    query_time = best_of(3, lambda: [HqueryProcessor(QUERY).query(soup) for soup in soups])
+    print('{0:<18} {1:>12.3f} ms for {2}'.format('full query', query_time * 1000, QUERY))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""
+Measure how fast make_soup's indexer assigns document-order indexes and attribute nodes, in nodes per second, against
+the recursive, closure-per-node traversal it replaced.
+
+Usage: python benchmarks/bench_indexing.py [<file.html>...]
+"""
+
+import sys
+from timeit import default_timer
+
+from corpus import load_corpus
+
+from bs4 import BeautifulSoup
+from hq.soup_util import AttributeNode, index_document, is_any_node, is_tag_node
+
+
+def recursive_index_document(soup):
+    counter = [0]
+
+    def visit_node(node):
+        node.hq_doc_index = counter[0]
+        counter[0] += 1
+        if is_tag_node(node):
+            attr_names = sorted(node.attrs.keys(), key=lambda name: name.lower())
+            node.hq_attrs = [AttributeNode(name, node.attrs[name]) for name in attr_names]
+            for attr in node.hq_attrs:
+                visit_node(attr)
+
+    def traverse(node):
+        if is_any_node(node):
+            visit_node(node)
+            if is_tag_node(node):
+                for attr in node.hq_attrs:
+                    traverse(attr)
+            if hasattr(node, 'children'):
+                for child in node.children:
+                    traverse(child)
+
+    traverse(soup)
+
+
+def nodes_per_second(indexer, soups, node_count, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        for soup in soups:
+            indexer(soup)
+        elapsed = default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return node_count / best
+
+
+def main():
+    corpus = load_corpus(sys.argv[1:], rows=5000)
+    soups = [BeautifulSoup(source, 'html.parser') for _, source in corpus]
+    node_count = sum(index_document(soup) for soup in soups)
+    print('Corpus: {0} document(s), {1} indexed nodes'.format(len(soups), node_count))
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100000))
+    before = nodes_per_second(recursive_index_document, soups, node_count)
+    after = nodes_per_second(index_document, soups, node_count)
+    print('recursive traversal: {0:>12,.0f} nodes/s'.format(before))
+    print('explicit stack:      {0:>12,.0f} nodes/s ({1:.2f}x)'.format(after, after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+Report peak memory per query on a large document. Each query runs in a fresh process, so that the peak resident set
+size reported by the OS belongs to that query alone; the peak Python allocation during evaluation (via tracemalloc)
+is reported alongside it.
+
+Usage: python benchmarks/bench_memory.py [<file.html>...]
+"""
+
+import resource
+import sys
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from corpus import load_corpus
+
+from hq.hquery.hquery_processor import HqueryProcessor
+from hq.soup_util import make_soup
+
+
+QUERIES = (
+    '//td',
+    'count(//tr[@data-position > 100])',
+    'sum(1 to 200000)',
+    'for $x in 1 to 100000 return string($x)',
+    'count(//td[position() mod 2 = 0])',
+    '//tr/@data-sku',
+)
+
+
+def measure(query, paths):
+    _, source = load_corpus(paths, rows=5000, count=1)[0]
+    soup = make_soup(source)
+    loaded_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    tracemalloc.start()
+    HqueryProcessor(query).query(soup)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return loaded_rss, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, traced_peak
+
+
+def main():
+    paths = sys.argv[1:]
+    print('{0:<45} {1:>12} {2:>12} {3:>14}'.format('query', 'loaded (MB)', 'peak (MB)', 'eval peak (MB)'))
+
+    for query in QUERIES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            loaded_rss, peak_rss, traced_peak = executor.submit(measure, query, paths).result()
+        print('{0:<45} {1:>12.1f} {2:>12.1f} {3:>14.1f}'.format(query,
+                                                               loaded_rss / 1024.0,
+                                                               peak_rss / 1024.0,
+                                                               traced_peak / 1048576.0))
+
+
+if __name__ == '__main__':
+    main()
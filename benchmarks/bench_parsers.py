@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+"""
+Compare BeautifulSoup tree builders on the same corpus: time spent parsing, and time spent by make_soup indexing the
+resulting tree, per backend.
+
+Usage: python benchmarks/bench_parsers.py [<file.html>...]
+"""
+
+import sys
+
+from corpus import best_of, load_corpus
+
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+from hq.soup_util import make_soup
+
+
+CANDIDATE_PARSERS = ('html.parser', 'lxml', 'html5lib')
+
+
+def main():
+    corpus = load_corpus(sys.argv[1:])
+    total_chars = sum(len(source) for _, source in corpus)
+    print('Corpus: {0} document(s), {1} characters'.format(len(corpus), total_chars))
+    print('{0:<12} {1:>10} {2:>10} {3:>10}'.format('parser', 'parse (s)', 'index (s)', 'total (s)'))
+
+    for parser in CANDIDATE_PARSERS:
+        if builder_registry.lookup(parser) is None:
+            print('{0:<12} not installed'.format(parser))
+            continue
+
+        parse_time = best_of(3, lambda: [BeautifulSoup(source, parser) for _, source in corpus])
+        total_time = best_of(3, lambda: [make_soup(source, parser=parser) for _, source in corpus])
+        print('{0:<12} {1:>10.3f} {2:>10.3f} {3:>10.3f}'.format(parser,
+                                                              parse_time,
+                                                              max(total_time - parse_time, 0),
+                                                              total_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+"""
+Time serialization of the whole document, and of every table row, with output.markup_to_text against Beautiful
+Soup's own prettify() and str(), in both pretty and ugly modes. Both must produce the same text; the script stops if
+they don't.
+
+Usage: python benchmarks/bench_serialize.py [<file.html>...]
+"""
+
+import sys
+
+from corpus import best_of, load_corpus
+
+from hq.output import markup_to_text
+from hq.soup_util import make_soup
+
+
+def bs4_markup_to_text(node, pretty):
+    return node.prettify().rstrip(' \t\n') if pretty else str(node)
+
+
+def main():
+    corpus = load_corpus(sys.argv[1:], rows=5000)
+    soups = [make_soup(source) for _, source in corpus]
+    cases = (('document', soups),
+             ('each tr', [tr for soup in soups for tr in soup.find_all('tr')]))
+
+    print('{0:<9} {1:<7} {2:>12} {3:>12} {4:>8}'.format('nodes', 'pretty', 'before (s)', 'after (s)', 'speedup'))
+    for name, nodes in cases:
+        for pretty in (True, False):
+            for node in nodes:
+                if markup_to_text(node, pretty) != bs4_markup_to_text(node, pretty):
+                    sys.exit('MISMATCH serializing {0} (pretty={1})'.format(name, pretty))
+
+            before = best_of(3, lambda: [bs4_markup_to_text(node, pretty) for node in nodes])
+            after = best_of(3, lambda: [markup_to_text(node, pretty) for node in nodes])
+            print('{0:<9} {1:<7} {2:>12.3f} {3:>12.3f} {4:>7.2f}x'.format(name, str(pretty), before, after,
+                                                                         before / after))
+
+
+if __name__ == '__main__':
+    main()
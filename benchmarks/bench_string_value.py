@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+"""
+Time string-value derivation for the body of each document, and for every table row, against the cursor-and-
+concatenation implementation it replaced. Both must produce the same text; the script stops if they don't. The
+"after" column clears the cached string values before each run; "cached" shows what a repeated lookup costs.
+
+Usage: python benchmarks/bench_string_value.py [<file.html>...]
+"""
+
+import sys
+
+from corpus import best_of, load_corpus
+
+from hq.soup_util import make_soup, derive_text_from_node, forget_derived_text
+from test.common_test_util import quadratic_derive_text_from_node
+
+
+def forget_all_derived_text(nodes):
+    for node in nodes:
+        forget_derived_text(node)
+
+
+def main():
+    corpus = load_corpus(sys.argv[1:], rows=5000)
+    soups = [make_soup(source) for _, source in corpus]
+    cases = (('body', [soup.body for soup in soups]),
+             ('each tr', [tr for soup in soups for tr in soup.find_all('tr')]))
+
+    print('{0:<8} {1:<9} {2:>12} {3:>12} {4:>12} {5:>8}'.format('nodes', 'preserve', 'before (s)', 'after (s)',
+                                                                'cached (s)', 'speedup'))
+    for name, nodes in cases:
+        for preserve_space in (False, True):
+            for node in nodes:
+                if derive_text_from_node(node, preserve_space) != quadratic_derive_text_from_node(node, preserve_space):
+                    sys.exit('MISMATCH deriving text for {0} (preserve={1})'.format(name, preserve_space))
+
+            derive_all = lambda: [derive_text_from_node(node, preserve_space) for node in nodes]
+            before = best_of(3, lambda: [quadratic_derive_text_from_node(node, preserve_space) for node in nodes])
+            after = best_of(3, derive_all, setup=lambda: forget_all_derived_text(nodes))
+            cached = best_of(3, derive_all)
+            print('{0:<8} {1:<9} {2:>12.3f} {3:>12.3f} {4:>12.3f} {5:>7.2f}x'.format(
+                name, str(preserve_space), before, after, cached, before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+"""
+Time evaluation of a representative set of queries with verbose tracing turned off, which is how every production
+query runs, and then once more with tracing on and stderr discarded, to show what the trace costs when it's wanted.
+Run it before and after a change to the evaluator to see what the untraced path gained or lost.
+
+Usage: python benchmarks/bench_tracing.py [<file.html>...]
+"""
+
+import os
+import sys
+
+from corpus import best_of, load_corpus
+
+from hq.hquery.hquery_processor import HqueryProcessor
+from hq.soup_util import make_soup
+from hq.verbosity import set_verbosity
+
+
+QUERIES = (
+    'count(//tr[td[@class="price"] > 250])',
+    'sum(//tr/td[2])',
+    'count(//td[. = "lorem"])',
+    '//tr -> string(@id)',
+    'count(//tr[position() mod 2 = 0]/td[1])',
+    '//tr[@data-position > 10 and @data-position < 200]/td[1]',
+    'count(//td[contains(., "ipsum")])',
+    'for $t in //tr let $x := $t/td[1] return ($x, 1 + 2)',
+    '//tr[@data-sku = //span/@data-sku]/@id',
+    '//tr[position() < 300] -> `${string(@id)}: ${string(td[1])}`',
+)
+
+
+def time_queries(soups, repeat):
+    return [best_of(repeat, lambda: [HqueryProcessor(query).query(soup) for soup in soups]) for query in QUERIES]
+
+
+def main():
+    corpus = load_corpus(sys.argv[1:], rows=2000, count=1)
+    soups = [make_soup(source) for _, source in corpus]
+    print('Corpus: {0} document(s)'.format(len(soups)))
+
+    untraced = time_queries(soups, repeat=5)
+    for query, elapsed in zip(QUERIES, untraced):
+        print('{0:>10.1f} ms  {1}'.format(elapsed * 1000, query))
+    print('{0:>10.1f} ms  total, tracing off'.format(sum(untraced) * 1000))
+
+    stderr = sys.stderr
+    with open(os.devnull, 'w') as devnull:
+        sys.stderr = devnull
+        set_verbosity(True)
+        try:
+            traced = time_queries(soups, repeat=1)
+        finally:
+            set_verbosity(False)
+            sys.stderr = stderr
+    print('{0:>10.1f} ms  total, tracing on (stderr discarded)'.format(sum(traced) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Synthetic HTML documents shared by the benchmark scripts. Every script also accepts paths to real HTML files on its
+command line, which are used instead of the generated corpus.
+"""
+
+import os
+import random
+import sys
+from timeit import default_timer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+_words = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do', 'eiusmod',
+          'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua')
+
+
+def best_of(repeat, fn, setup=None):
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = default_timer()
+        fn()
+        elapsed = default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def generate_page(rows=2000, seed=0):
+    rnd = random.Random(seed)
+
+    def words(count):
+        return ' '.join(rnd.choice(_words) for _ in range(count))
+
+    chunks = ['<!DOCTYPE html>\n<html><head><title>{0}</title></head><body>'.format(words(4)),
+              '<div id="nav">']
+    for index in range(rows // 20):
+        chunks.append('<a href="#row{0}" class="nav-link">{1}</a> '.format(index * 20, words(2)))
+    chunks.append('</div><table class="catalog">')
+
+    for index in range(rows):
+        chunks.append(
+            '<tr id="row{0}" class="item {1}" data-sku="sku-{2}" data-position="{0}" style="color: #{3:06x}">'
+            '<td class="name">{4}</td>'
+            '<td class="price">&nbsp;{5}.{6:02d}</td>'
+            '<td class="description"><p>{7} <b>{8}</b> {9}</p><!-- row {0} --></td>'
+            '<td><a href="#row{10}" title="{11}">related</a></td>'
+            '</tr>\n'.format(index, 'odd' if index % 2 else 'even', rnd.randint(0, rows), rnd.randint(0, 0xffffff),
+                             words(3), rnd.randint(1, 500), rnd.randint(0, 99), words(8), words(2), words(6),
+                             rnd.randint(0, rows - 1), words(3)))
+
+    chunks.append('</table><div class="stock">')
+    for index in range(rows // 4):
+        chunks.append('<span class="stock-item" data-sku="sku-{0}">{1}</span>'.format(rnd.randint(0, rows), index))
+    chunks.append('</div></body></html>')
+    return ''.join(chunks)
+
+
+def generate_deep_page(depth=5000):
+    return '<html><body>{0}leaf{1}</body></html>'.format('<div class="level">' * depth, '</div>' * depth)
+
+
+def load_corpus(paths=None, rows=2000, count=3):
+    if paths:
+        result = []
+        for path in paths:
+            with open(path) as file:
+                result.append((path, file.read()))
+        return result
+    else:
+        return [('generated-{0}'.format(seed), generate_page(rows=rows, seed=seed)) for seed in range(count)]
@@ -0,0 +1,103 @@
+import json
+import os
+from glob import glob, has_magic
+from multiprocessing import Pool
+
+from .config import settings
+from .hquery.evaluation_error import HqueryEvaluationError
+from .hquery.evaluation_in_context import evaluate_in_context
+from .hquery.hquery_processor import compile_hquery
+from .output import convert_results_to_output_items
+from .soup_util import make_soup, DEFAULT_PARSER
+from .verbosity import verbose_print, set_verbosity
+
+
+_worker_query = {}
+
+
+def expand_input_paths(inputs):
+    for input in inputs:
+        if has_magic(input):
+            candidates = sorted(glob(input, recursive=True))
+            if len(candidates) == 0:
+                verbose_print('Glob pattern "{0}" matched no files'.format(input))
+        else:
+            candidates = [input]
+
+        for candidate in candidates:
+            if os.path.isdir(candidate):
+                for path in _walk_directory(candidate):
+                    yield path
+            else:
+                yield candidate
+
+
+def query_file(path, expression_fn, parser=DEFAULT_PARSER, preserve_space=False, pretty=True):
+    try:
+        with open(path) as file:
+            source = file.read()
+        verbose_print('Read {0} characters of input from {1}'.format(len(source), path))
+        soup = make_soup(source, parser=parser)
+
+        if expression_fn is None:
+            result = [soup]
+        else:
+            result = evaluate_in_context(soup, expression_fn, preserve_space=preserve_space)
+
+        return {'input': path,
+                'results': convert_results_to_output_items(result, pretty=pretty, preserve_space=preserve_space)}
+
+    except (IOError, UnicodeDecodeError) as error:
+        return {'input': path, 'error': 'INPUT ERROR: {0}'.format(error)}
+    except HqueryEvaluationError as error:
+        return {'input': path, 'error': 'QUERY ERROR: {0}'.format(error)}
+
+
+def query_files(paths, expression_fn, parser=DEFAULT_PARSER, preserve_space=False, pretty=True):
+    for path in paths:
+        yield query_file(path, expression_fn, parser=parser, preserve_space=preserve_space, pretty=pretty)
+
+
+def query_files_in_parallel(paths, expression, jobs, parser=DEFAULT_PARSER, preserve_space=False, pretty=True,
+                            ordered=True):
+    pool = Pool(jobs,
+                initializer=_initialize_worker,
+                initargs=(expression, parser, preserve_space, pretty, settings.VERBOSE))
+    try:
+        map_fn = pool.imap if ordered else pool.imap_unordered
+        for record in map_fn(_query_file_in_worker, paths):
+            yield record
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+def record_to_ndjson(record):
+    return json.dumps(record)
+
+
+def _initialize_worker(expression, parser, preserve_space, pretty, verbose):
+    set_verbosity(verbose)
+    _worker_query['expression_fn'] = compile_hquery(expression, preserve_space) if expression else None
+    _worker_query['parser'] = parser
+    _worker_query['preserve_space'] = preserve_space
+    _worker_query['pretty'] = pretty
+
+
+def _query_file_in_worker(path):
+    return query_file(path,
+                      _worker_query['expression_fn'],
+                      parser=_worker_query['parser'],
+                      preserve_space=_worker_query['preserve_space'],
+                      pretty=_worker_query['pretty'])
+
+
+def _walk_directory(directory):
+    for dir_path, dir_names, file_names in os.walk(directory):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            yield os.path.join(dir_path, file_name)
@@ -1,3 +1,4 @@
 
 class settings:
+    PROFILE = False
     VERBOSE = False
@@ -3,34 +3,72 @@
 """hq - Powerful HTML querying, filtering, slicing and dicing!
 
 Usage:
-  hq.py [options] <expression>
-  hq.py [options] -p <file>
+  hq.py [options] <expression> [<input>...]
+  hq.py [options] -p <file> [<input>...]
   hq.py --version
   hq.py (-h | --help)
 
 Options:
+  --encoding <name>     Encode printed results with the named codec. Ignored
+                        in batch mode [default: utf-8].
+  --explain             Print the plan the expression compiles to, showing
+                        its location path steps, predicates, operators and
+                        FLWOR clauses along with the rewrites applied to
+                        them, instead of evaluating it. No HTML is read.
   -f, --file <file>     Read HTML input from a file rather than stdin.
+  -j, --jobs <n>        In batch mode, spread input documents across <n>
+                        worker processes [default: 1].
+  --output-buffer <n>   Collect up to <n> bytes of encoded results before
+                        writing them to stdout; 0 writes each result as soon
+                        as it's ready. Ignored in batch mode [default: 65536].
+  --parser <name>       Parse HTML with the named BeautifulSoup tree builder,
+                        such as "lxml" or "html5lib." Falls back to the
+                        built-in parser if the named one isn't installed
+                        [default: html.parser].
   --preserve            Preserve extra whitespace in string values derived
                         from HTML contents. The default behavior is to
                         automatically apply normalize-string to all string
                         values derived from HTML elements and attributes, and
                         to convert non-breaking spaces into plain spaces.
+  --profile             When the query finishes, print a table to stderr
+                        showing, for each location path step, predicate,
+                        function call and FLWOR clause, how often it ran, how
+                        many nodes went in and came out, and how much time
+                        it took, ranked by self time. In batch mode, only
+                        queries evaluated in this process (--jobs 1) are
+                        counted.
   -p, --program <file>  Read HQuery expression from a file instead of the
                         command line.
   -u, --ugly            Do not pretty-print HTML markup on output.
+  --unordered           In batch mode with more than one job, print each
+                        record as soon as it is ready instead of in input
+                        order.
   -v, --verbose         Print verbose query parsing and evaluation information
                         to stderr.
   --version             Display the installed HQ version.
 
-HTML is read from stdin.
+HTML is read from stdin, unless one or more <input> arguments are given. Each
+<input> may be a file, a directory (searched recursively) or a glob pattern
+(quoted, so that hq expands it rather than the shell). In this "batch mode,"
+the expression is parsed once and evaluated against every input document,
+and the results are printed as newline-delimited JSON, one record per input:
+
+  {"input": "<path>", "results": ["<result>", ...]}
+
+Inputs that cannot be read or queried produce an "error" instead of
+"results."
 
 """
 
-from docopt import docopt
+import codecs
 
+from docopt import docopt, DocoptExit
+
+from .batch import expand_input_paths, query_files, query_files_in_parallel, record_to_ndjson
 from .hquery.evaluation_error import HqueryEvaluationError
-from .hquery.hquery_processor import HqueryProcessor, HquerySyntaxError
-from .output import convert_results_to_output_text
+from .hquery.hquery_processor import HqueryProcessor, HquerySyntaxError, compile_hquery
+from .output import ResultWriter
+from .profiling import print_profile_report, set_profiling
 from .soup_util import make_soup
 from .verbosity import verbose_print, set_verbosity
 
@@ -38,32 +76,67 @@ __version__ = '0.0.4'
 
 
 def main():
-    from sys import stderr, stdin   # So py.tests have a chance to hook stdout & stderr
+    from sys import stderr, stdin, stdout   # So py.tests have a chance to hook stdout & stderr
 
     args = docopt(__doc__, version='HQ {0}'.format(__version__))
+    jobs = _positive_int_option(args, '--jobs')
+    output_buffer_size = _non_negative_int_option(args, '--output-buffer')
+    _check_encoding_option(args)
     preserve_space = bool(args['--preserve'])
     set_verbosity(bool(args['--verbose']))
+    set_profiling(bool(args['--profile']))
 
     try:
+        if args['--program']:
+            with open(args['--program']) as file:
+                expression = file.read()
+        else:
+            expression = args['<expression>']
+
+        if args['--explain']:
+            if len(expression) > 0:
+                print(HqueryProcessor(expression, preserve_space).explain(), file=stdout)
+            return
+
+        if args['<input>']:
+            _batch_query(expression,
+                         args['<input>'],
+                         jobs=jobs,
+                         ordered=(not args['--unordered']),
+                         parser=args['--parser'],
+                         pretty=(not args['--ugly']),
+                         preserve_space=preserve_space)
+            _print_profile_if_requested(args, stderr)
+            return
+
         if args['--file']:
             with open(args['--file']) as file:
                 source = file.read()
         else:
             source = stdin.read()
         verbose_print('Read {0} characters of input'.format(len(source)))
-        soup = make_soup(source)
+        soup = make_soup(source, parser=args['--parser'])
 
-        if args['--program']:
-            with open(args['--program']) as file:
-                expression = file.read()
-        else:
-            expression = args['<expression>']
         if len(expression) > 0:
-            result = HqueryProcessor(expression, preserve_space).query(soup)
+            results = HqueryProcessor(expression, preserve_space).query_items(soup)
         else:
-            result = [soup]
-
-        print(convert_results_to_output_text(result, pretty=(not args['--ugly']), preserve_space=preserve_space))
+            results = [soup]
+
+        writer = ResultWriter(_binary_stream(stdout),
+                              pretty=(not args['--ugly']),
+                              preserve_space=preserve_space,
+                              encoding=args['--encoding'],
+                              buffer_size=output_buffer_size)
+        try:
+            try:
+                writer.write_all(results)
+            finally:
+                writer.flush()
+            writer.finish()
+        except UnicodeEncodeError as error:
+            print('\nOUTPUT ERROR: {0}\n'.format(str(error)), file=stderr)
+            return
+        _print_profile_if_requested(args, stderr)
 
     except HquerySyntaxError as error:
         print('\nSYNTAX ERROR: {0}\n'.format(str(error)), file=stderr)
@@ -71,5 +144,58 @@ def main():
         print('\nQUERY ERROR: {0}\n'.format(str(error)), file=stderr)
 
 
+def _check_encoding_option(args):
+    try:
+        codecs.lookup(args['--encoding'])
+    except LookupError:
+        raise DocoptExit('--encoding must name a known codec, not "{0}"'.format(args['--encoding']))
+
+
+def _non_negative_int_option(args, name):
+    value = args[name]
+    if not value.isdigit():
+        raise DocoptExit('{0} must be a non-negative integer, not "{1}"'.format(name, value))
+    return int(value)
+
+
+def _positive_int_option(args, name):
+    value = args[name]
+    if not value.isdigit() or int(value) < 1:
+        raise DocoptExit('{0} must be a positive integer, not "{1}"'.format(name, value))
+    return int(value)
+
+
+def _print_profile_if_requested(args, stderr):
+    if args['--profile']:
+        print_profile_report(stderr)
+
+
+def _binary_stream(stream):
+    binary = getattr(stream, 'buffer', None)
+    if binary is None:
+        return stream
+    stream.flush()
+    return binary
+
+
+def _batch_query(expression, inputs, jobs, ordered, parser, pretty, preserve_space):
+    if len(expression) > 0:
+        verbose_print(u'PARSING HQUERY ONCE FOR BATCH', indent_after=True)
+        expression_fn = compile_hquery(expression, preserve_space)
+        verbose_print('FINISHED PARSING', outdent_before=True)
+    else:
+        expression_fn = None
+
+    paths = expand_input_paths(inputs)
+    if jobs > 1:
+        records = query_files_in_parallel(paths, expression, jobs, parser=parser,
+                                          preserve_space=preserve_space, pretty=pretty, ordered=ordered)
+    else:
+        records = query_files(paths, expression_fn, parser=parser, preserve_space=preserve_space, pretty=pretty)
+
+    for record in records:
+        print(record_to_ndjson(record))
+
+
 if __name__ == '__main__':
     main()
@@ -1,5 +1,6 @@
 from hq.hquery.object_type import debug_dump_anything
-from hq.verbosity import verbose_print
+from hq.hquery.query_plan import PlanNode
+from hq.verbosity import traced
 
 
 class ComputedHashKeyValueConstructor:
@@ -7,6 +8,16 @@ class ComputedHashKeyValueConstructor:
     def __init__(self, key):
         self.key = key
         self.value_fn = None
+        self._evaluate_value = traced(
+            self._evaluate_value,
+            lambda: 'Evaluating value expression for constructed hash key "{0}"'.format(self.key),
+            lambda value: u'Finished evaluating; value of constructed hash key "{0}" is {1}'.format(
+                self.key, debug_dump_anything(value)))
+
+
+    @property
+    def hq_plan(self):
+        return PlanNode('hash key "{0}"'.format(self.key), [self.value_fn])
 
 
     def set_value(self, fn):
@@ -14,18 +25,16 @@ class ComputedHashKeyValueConstructor:
 
 
     def evaluate(self):
-        verbose_print('Evaluating value expression for constructed hash key "{0}"'.format(self.key), indent_after=True)
-
-        value = self.value_fn()
+        return HashKeyValue(self.key, self._evaluate_value())
 
-        msg = u'Finished evaluating; value of constructed hash key "{0}" is {1}'
-        verbose_print(lambda: msg.format(self.key, debug_dump_anything(value)), outdent_before=True)
 
-        return HashKeyValue(self.key, value)
+    def _evaluate_value(self):
+        return self.value_fn()
 
 
 
 class HashKeyValue:
+    __slots__ = ('key', 'value')
 
     def __init__(self, key, value):
         self.key = key
@@ -3,6 +3,7 @@ import json
 from hq.hquery.evaluation_error import HqueryEvaluationError
 from hq.hquery.object_type import string_value, is_string, debug_dump_anything, is_hash, \
     is_boolean, is_number
+from hq.hquery.query_plan import PlanNode
 from hq.hquery.sequences import make_sequence
 from hq.hquery.syntax_error import HquerySyntaxError
 from hq.soup_util import is_tag_node, is_text_node
@@ -10,6 +11,7 @@ from hq.verbosity import verbose_print
 
 
 class JsonArray:
+    __slots__ = ('contents',)
 
     def __init__(self, contents):
         if not isinstance(contents, list):
@@ -33,6 +35,11 @@ class ComputedJsonArrayConstructor:
         self.contents = None
 
 
+    @property
+    def hq_plan(self):
+        return PlanNode('array constructor', [self.contents])
+
+
     def set_contents(self, expression_fn):
         if self.contents is not None:
             raise HquerySyntaxError('computed JSON array constructor already has contents')
@@ -63,4 +70,4 @@ class ComputedJsonArrayConstructor:
 
 
     def _gab(self, message):
-        verbose_print('JSON array constructor {0}'.format(message))
+        verbose_print(lambda: 'JSON array constructor {0}'.format(message()))
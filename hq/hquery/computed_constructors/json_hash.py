@@ -7,6 +7,7 @@ from hq.hquery.expression_context import peek_context
 from hq.hquery.functions.core_number import number
 from hq.hquery.object_type import string_value, object_type_name, is_string, is_number, is_boolean, \
     is_hash, is_array, is_sequence
+from hq.hquery.query_plan import PlanNode
 from hq.hquery.sequences import make_sequence
 from hq.hquery.syntax_error import HquerySyntaxError
 from hq.soup_util import is_tag_node, debug_dump_node, is_any_node, is_text_node, debug_dump_long_string
@@ -14,6 +15,7 @@ from hq.verbosity import verbose_print
 
 
 class JsonHash:
+    __slots__ = ('contents',)
 
     def __init__(self, contents):
         if not isinstance(contents, dict):
@@ -98,6 +100,12 @@ class ComputedJsonHashConstructor:
         self.filters = []
 
 
+    @property
+    def hq_plan(self):
+        filters = ' ({0} filters)'.format(len(self.filters)) if self.filters else ''
+        return PlanNode('hash constructor{0}'.format(filters), [self.contents])
+
+
     def set_contents(self, expression_fn):
         if self.contents is not None:
             raise HquerySyntaxError('computed JSON hash constructor already has contents')
@@ -135,10 +143,10 @@ class ComputedJsonHashConstructor:
                 else:
                     result[item.key] = string_value(item.value)
             elif is_tag_node(item):
-                self._gab('adding element "{0}" to contents'.format(item.name))
+                self._gab(lambda: 'adding element "{0}" to contents'.format(item.name))
                 self._process_tag(result, item)
             elif is_text_node(item) or is_string(item):
-                self._gab('adding text "{0}" to contents'.format(debug_dump_long_string(string_value(item))))
+                self._gab(lambda: 'adding text "{0}" to contents'.format(debug_dump_long_string(string_value(item))))
                 result['text'] = self._append_to_text(result['text'] if 'text' in result else '', string_value(item))
             else:
                 value_desc = debug_dump_node(item) if is_any_node(item) else object_type_name(item)
@@ -156,7 +164,7 @@ class ComputedJsonHashConstructor:
 
 
     def _gab(self, message):
-        verbose_print('JSON hash constructor {0}'.format(message))
+        verbose_print(lambda: 'JSON hash constructor {0}'.format(message()))
 
 
     def _process_filters(self, result):
@@ -1,12 +1,13 @@
 from hq.verbosity import verbose_print
 from hq.hquery.functions.core_boolean import boolean
 from hq.hquery.functions.core_number import number
-from hq.hquery.object_type import object_type, string_value, object_type_name
+from hq.hquery.object_type import object_type, string_value, object_type_name, SEQUENCE
 from hq.hquery.evaluation_error import HqueryEvaluationError
 
 
 def _eq_bool_vs_primitive(bool_val, other_val):
-    verbose_print('Comparing boolean value {0} with non-node-set value {1} (coerced to {2})'.format(bool_val, other_val, boolean(other_val)))
+    verbose_print(lambda: 'Comparing boolean value {0} with non-node-set value {1} (coerced to {2})'.format(
+        bool_val, other_val, boolean(other_val)))
     return bool_val == boolean(other_val)
 
 
@@ -15,14 +16,15 @@ def _eq_native(first, second):
 
 
 def _eq_node_sets(first, second):
-    first_values = set([string_value(node) for node in first])
-    second_values = set([string_value(node) for node in second])
+    verbose_print(lambda: 'Comparing two nodes sets (size {0} and {1}).'.format(len(first), len(second)))
+    return _any_string_value_in(first, set(string_value(node) for node in second))
 
-    verbose_print('Comparing two nodes sets (size {0} and {1}).'.format(len(first_values), len(second_values)))
 
-    for first_value in first_values:
-        if first_value in second_values:
-            verbose_print(u'Found value "{0}" from first node set in second node set'.format(first_value))
+def _any_string_value_in(nodes, values):
+    for node in nodes:
+        value = string_value(node)
+        if value in values:
+            verbose_print(lambda: u'Found value "{0}" from first node set in second node set'.format(value))
             return True
 
     verbose_print('Found no matching nodes between node sets.')
@@ -34,14 +36,14 @@ def _eq_node_set_vs_bool(bool_val, nodes_val):
 
 
 def _eq_node_set_vs_number(nodes_val, num_val):
-    verbose_print('(=) comparing number {0} to {1} nodes'.format(num_val, len(nodes_val)))
+    verbose_print(lambda: '(=) comparing number {0} to {1} nodes'.format(num_val, len(nodes_val)))
 
     for node in nodes_val:
         node_str_val = string_value(node)
         node_num_val = number(node_str_val)
-        verbose_print('(=) node string value "{0}" is{1} equal to "{2}"'.format(
+        verbose_print(lambda: '(=) node string value "{0}" is{1} equal to "{2}"'.format(
             node_num_val,
-            (' not' if node_num_val == num_val else ''),
+            ('' if node_num_val == num_val else ' not'),
             num_val))
 
         if node_num_val == num_val:
@@ -52,11 +54,11 @@ def _eq_node_set_vs_number(nodes_val, num_val):
 
 def _eq_node_set_vs_string(nodes_val, string_val):
     string_val = str(string_val)
-    verbose_print(u'(=) comparing number "{0}" to {1} nodes'.format(string_val, len(nodes_val)))
+    verbose_print(lambda: u'(=) comparing string "{0}" to {1} nodes'.format(string_val, len(nodes_val)))
 
     for node in nodes_val:
         node_val_string = string_value(node)
-        verbose_print(u'(=) node string value "{0}" is{1} equal to "{2}"'.format(
+        verbose_print(lambda: u'(=) node string value "{0}" is{1} equal to "{2}"'.format(
             node_val_string,
             ('' if node_val_string == string_val else ' not'),
             string_val))
@@ -92,5 +94,24 @@ def equals(first, second):
         raise HqueryEvaluationError(msg.format(object_type_name(first_type), object_type_name(second_type)))
 
 
+def make_equality_probe(fixed):
+    """Return a function of one value that compares it to fixed the way equals does. When fixed is a node set or
+    sequence, its string values are hashed once, up front, rather than on every comparison."""
+    if object_type(fixed) != SEQUENCE:
+        return lambda value: equals(value, fixed)
+
+    fixed_values = set(string_value(item) for item in fixed)
+
+    def probe(value):
+        if object_type(value) == SEQUENCE:
+            verbose_print(lambda: 'Probing {0} hashed values with a node set of size {1}.'.format(len(fixed_values),
+                                                                                                  len(value)))
+            return boolean(_any_string_value_in(value, fixed_values))
+        else:
+            return equals(value, fixed)
+
+    return probe
+
+
 def not_equals(first, second):
     return boolean(not bool(equals(first, second)))
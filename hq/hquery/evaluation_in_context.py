@@ -1,6 +1,6 @@
 from hq.hquery.evaluation_error import HqueryEvaluationError
 from hq.hquery.expression_context import push_context, pop_context
-from hq.hquery.sequences import make_node_set
+from hq.hquery.sequences import merge_node_sets, iterate_sequence
 from hq.soup_util import is_any_node, debug_dump_long_string
 
 
@@ -10,7 +10,7 @@ def evaluate_across_contexts(node_set, expression_fn):
     node_set_len = len(node_set)
     ragged = [evaluate_in_context(node, expression_fn, position=index+1, size=node_set_len)
               for index, node in enumerate(node_set)]
-    return make_node_set([item for sublist in ragged for item in sublist])
+    return merge_node_sets(ragged)
 
 
 def evaluate_in_context(node, expression_fn, position=1, size=1, preserve_space=None):
@@ -18,6 +18,20 @@ def evaluate_in_context(node, expression_fn, position=1, size=1, preserve_space=
         raise HqueryEvaluationError('cannot use {0} "{1}" as context node'.format(type(node),
                                                                                   debug_dump_long_string(str(node))))
     push_context(node, position, size, preserve_space)
-    result = expression_fn()
-    pop_context()
-    return result
+    try:
+        return expression_fn()
+    finally:
+        pop_context()
+
+
+def iterate_in_context(node, expression_fn, preserve_space=None):
+    """Like evaluate_in_context, but yield the result's items one at a time."""
+    if not is_any_node(node):
+        raise HqueryEvaluationError('cannot use {0} "{1}" as context node'.format(type(node),
+                                                                                  debug_dump_long_string(str(node))))
+    push_context(node, preserve_space=preserve_space)
+    try:
+        for item in iterate_sequence(expression_fn):
+            yield item
+    finally:
+        pop_context()
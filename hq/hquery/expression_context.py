@@ -1,3 +1,4 @@
+from hq.config import settings
 from hq.verbosity import verbose_print
 from ..soup_util import debug_dump_node
 
@@ -5,6 +6,7 @@ context_stack = []
 
 
 class ExpressionContext:
+    __slots__ = ('node', 'position', 'size', 'preserve_space')
 
     def __init__(self, node, position=1, size=1, preserve_space=None):
         self.node = node
@@ -40,12 +42,14 @@ def peek_context():
 
 def pop_context():
     result = context_stack.pop()
-    msg = u'Popping (node={0}, position={1}, size={2} off of context stack.'
-    verbose_print(lambda: msg.format(debug_dump_node(result.node), result.position, result.size))
+    if settings.VERBOSE:
+        msg = u'Popping (node={0}, position={1}, size={2}) off of context stack.'
+        verbose_print(msg.format(debug_dump_node(result.node), result.position, result.size))
     return result
 
 
 def push_context(node, position=1, size=1, preserve_space=None):
-    msg = u'Pushing (node={0}, position={1}, size={2} on context stack.'
-    verbose_print(lambda: msg.format(debug_dump_node(node), position, size))
+    if settings.VERBOSE:
+        msg = u'Pushing (node={0}, position={1}, size={2}) on context stack.'
+        verbose_print(msg.format(debug_dump_node(node), position, size))
     context_stack.append(ExpressionContext(node=node, position=position, size=size, preserve_space=preserve_space))
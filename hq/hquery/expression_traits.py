@@ -0,0 +1,94 @@
+from hq.hquery.object_type import BOOLEAN, NUMBER, SEQUENCE, STRING
+
+
+LAST_POSITION = 'last'
+
+
+class ExpressionTraits:
+    __slots__ = ('result_type', 'uses_position', 'uses_context', 'variables', 'position_selector')
+
+    def __init__(self, result_type=None, uses_position=True, uses_context=True, variables=None,
+                 position_selector=None):
+        self.result_type = result_type
+        self.uses_position = uses_position
+        self.uses_context = uses_context
+        self.variables = variables
+        self.position_selector = position_selector
+
+    def __repr__(self):
+        return ('ExpressionTraits(result_type={0}, uses_position={1}, uses_context={2}, variables={3}, '
+                'position_selector={4})').format(self.result_type, self.uses_position, self.uses_context,
+                                                 self.variables, self.position_selector)
+
+
+UNKNOWN_TRAITS = ExpressionTraits()
+
+
+_function_result_types = {
+    BOOLEAN: ('boolean', 'class', 'contains', 'even', 'false', 'matches', 'not', 'odd', 'starts-with', 'true'),
+    NUMBER: ('ceiling', 'count', 'floor', 'last', 'number', 'position', 'round', 'string-length', 'sum'),
+    SEQUENCE: ('id', 'tokenize'),
+    STRING: ('concat', 'lower-case', 'name', 'normalize-space', 'replace', 'string', 'string-join', 'substring',
+             'substring-after', 'substring-before', 'upper-case'),
+}
+function_result_types = {name: result_type
+                         for result_type, names in _function_result_types.items()
+                         for name in names}
+positional_functions = {'even', 'last', 'odd', 'position'}
+context_node_functions = {'class', 'id', 'matches', 'name', 'normalize-space', 'string', 'string-length'}
+
+
+def any_uses_context(*expression_fns):
+    return any(traits_of(fn).uses_context for fn in expression_fns)
+
+
+def any_uses_position(*expression_fns):
+    return any(traits_of(fn).uses_position for fn in expression_fns)
+
+
+def is_context_free(expression_fn):
+    # Absolute paths count as context free; every node a step yields belongs to the same document.
+    traits = traits_of(expression_fn)
+    return not (traits.uses_context or traits.uses_position)
+
+
+def is_variable_free(expression_fn, variable_names):
+    names = traits_of(expression_fn).variables
+    return names is not None and names.isdisjoint(variable_names)
+
+
+def is_non_positional_predicate(expression_fn):
+    traits = traits_of(expression_fn)
+    return traits.result_type not in (None, NUMBER) and not traits.uses_position
+
+
+def position_selector_of(expression_fn):
+    """The constant number (or LAST_POSITION) a predicate always evaluates to, or None."""
+    return traits_of(expression_fn).position_selector
+
+
+def set_traits(expression_fn, result_type=None, uses_position=True, uses_context=True, variables=None,
+               position_selector=None):
+    setattr(_traits_holder(expression_fn),
+            'hq_traits',
+            ExpressionTraits(result_type, uses_position, uses_context, variables, position_selector=position_selector))
+    return expression_fn
+
+
+def variables_of(*expression_fns):
+    """Names of the variables the expressions refer to, or None if that isn't known for one of them."""
+    result = frozenset()
+    for expression_fn in expression_fns:
+        names = traits_of(expression_fn).variables
+        if names is None:
+            return None
+        result |= names
+    return result
+
+
+def traits_of(expression_fn):
+    return getattr(_traits_holder(expression_fn), 'hq_traits', UNKNOWN_TRAITS)
+
+
+def _traits_holder(expression_fn):
+    return getattr(expression_fn, '__self__', expression_fn)
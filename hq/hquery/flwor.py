@@ -1,32 +1,74 @@
+from hq.hquery.expression_traits import ExpressionTraits, any_uses_context, any_uses_position, is_variable_free, \
+    variables_of
 from hq.hquery.object_type import debug_dump_anything
-from hq.hquery.sequences import make_sequence, sequence_concat
+from hq.hquery.query_plan import PlanNode
+from hq.hquery.sequences import make_sequence, extend_sequence, iterate_sequence
 from hq.hquery.syntax_error import HquerySyntaxError
 from hq.hquery.variables import push_variable, variable_scope
+from hq.profiling import profiled
 from hq.soup_util import debug_dump_long_string
-from hq.verbosity import verbose_print
+from hq.verbosity import traced, verbose_print
 
 
 class Flwor:
 
     def __init__(self):
         self.global_variables = []
+        self.invariant_variables = []
         self.per_iteration_variables = []
         self.return_expression = None
         self.sequence_expression = None
         self.sequence_variable = None
 
+        self._evaluate_iteration = traced(self._evaluate_iteration, self._entry_message, self._exit_message)
+        self._evaluate_without_iteration = traced(self._evaluate_without_iteration,
+                                                  self._entry_message,
+                                                  self._exit_message)
+
 
     def __str__(self):
+        loop_variables = self.invariant_variables + self.per_iteration_variables
         return '{0}{1}return <expr>'.format(
             '' if self.sequence_expression is None else 'for ${0}:=<expr> '.format(self.sequence_variable),
-            (' '.join('let ${0} := <expr>'.format(v[0]) for v in self.per_iteration_variables) + ' ') if len(self.per_iteration_variables) else ''
+            (' '.join('let ${0} := <expr>'.format(v[0]) for v in loop_variables) + ' ') if len(loop_variables) else ''
         )
 
 
+    @property
+    def hq_traits(self):
+        expressions = [let[1] for let in self.global_variables + self.invariant_variables +
+                       self.per_iteration_variables]
+        expressions.append(self.return_expression)
+        if self.sequence_expression is not None:
+            expressions.append(self.sequence_expression)
+        return ExpressionTraits(uses_position=any_uses_position(*expressions),
+                                uses_context=any_uses_context(*expressions),
+                                variables=variables_of(*expressions))
+
+
+    @property
+    def hq_plan(self):
+        clauses = [PlanNode('let ${0} :='.format(let[0]), [let[1]]) for let in self.global_variables]
+        if self.sequence_expression is not None:
+            clauses.append(PlanNode('for ${0} in'.format(self.sequence_variable), [self.sequence_expression]))
+            clauses.extend(PlanNode('let ${0} :='.format(let[0]),
+                                    [let[1]],
+                                    ['loop invariant, so hoisted out of the loop and evaluated once'])
+                           for let in self.invariant_variables)
+            clauses.extend(PlanNode('let ${0} :='.format(let[0]), [let[1]]) for let in self.per_iteration_variables)
+        clauses.append(PlanNode('return', [self.return_expression]))
+        return PlanNode('FLWOR', clauses)
+
+
     def append_let(self, variable_name, expression_fn):
-        var_tuple = (variable_name, expression_fn)
+        var_tuple = (variable_name,
+                     expression_fn,
+                     profiled(expression_fn, 'let', lambda: 'let ${0} of {1}'.format(variable_name, self)))
         if self.sequence_expression is None:
             self.global_variables.append(var_tuple)
+        elif self._is_loop_invariant(variable_name, expression_fn):
+            verbose_print('Hoisting loop-invariant let ${0} out of FLWOR iteration'.format(variable_name))
+            self.invariant_variables.append(var_tuple)
         else:
             self.per_iteration_variables.append(var_tuple)
 
@@ -36,16 +78,10 @@ class Flwor:
 
 
     def evaluate(self):
-        verbose_print('Evaluating FLWOR {0}'.format(self), indent_after=True)
-
         if self.sequence_expression is not None:
-            result = self._evaluate_iteration()
+            return self._evaluate_iteration()
         else:
-            result = self._evaluate_without_iteration()
-
-        verbose_print(lambda: 'FLWOR evaluation completed; returning {0}'.format(debug_dump_anything(result)),
-                      outdent_before=True)
-        return result
+            return self._evaluate_without_iteration()
 
 
     def set_iteration_expression(self, variable_name, expression_fn):
@@ -53,53 +89,95 @@ class Flwor:
             raise HquerySyntaxError('More than one "for" clause found in FLWOR "{0}"'.format(self.debug_dump()))
         self.sequence_variable = variable_name
         self.sequence_expression = expression_fn
+        self._for_clause = profiled(expression_fn,
+                                    'for',
+                                    lambda: 'for ${0} of {1}'.format(variable_name, self))
 
 
     def set_return_expression(self, expression_fn):
         if self.return_expression is not None:
             raise HquerySyntaxError('More than one return clause found for FLWOR {0}'.format(self.debug_dump()))
         self.return_expression = expression_fn
+        self._return_clause = profiled(expression_fn, 'return', lambda: 'return of {0}'.format(self))
+
+
+    def iterate_items(self):
+        """Yield the FLWOR's result items one at a time, streaming those of a streamable return expression."""
+        verbose_print(lambda: 'Streaming results of FLWOR {0}'.format(self), indent_after=True)
+
+        if self.sequence_expression is not None:
+            for items in self._visit_each_item(lambda: iterate_sequence(self._return_clause)):
+                for item in items:
+                    yield item
+        else:
+            with variable_scope():
+                self._push_global_variables()
+                for item in iterate_sequence(self._return_clause):
+                    yield item
+
+        verbose_print('FLWOR streaming completed', outdent_before=True)
 
 
     def _evaluate_iteration(self):
+        result = []
+
+        for value in self._visit_each_item(self._return_clause):
+            extend_sequence(result, value)
+
+        return result
+
+
+    def _visit_each_item(self, visit):
+        """Yield what visit() returns with the loop variable and per-iteration lets bound to each item in turn."""
         with variable_scope():
             self._push_global_variables()
 
-            sequence = make_sequence(self.sequence_expression())
-            verbose_print('Iterating over sequence containing {0} items'.format(len(sequence)))
-            result = []
+            sequence = make_sequence(self._for_clause())
+            verbose_print(lambda: 'Iterating over sequence containing {0} items'.format(len(sequence)))
 
-            for item in sequence:
-                verbose_print(lambda: u'Visiting item {0}'.format(debug_dump_anything(item)), indent_after=True)
+            if len(sequence) > 0:
+                self._push_invariant_variables()
 
+            for item in sequence:
                 with variable_scope():
                     push_variable(self.sequence_variable, make_sequence(item))
                     self._push_iteration_variables()
-                    this_result = make_sequence(self.return_expression())
-                    verbose_print('Return clause yielded {0} results for this visit'.format(len(this_result)))
-                    result = sequence_concat(result, this_result)
-
-                verbose_print('Visit finished', outdent_before=True)
-
-        return result
+                    yield visit()
 
 
     def _evaluate_without_iteration(self):
         with variable_scope():
             self._push_global_variables()
-            verbose_print('Evaluating return expression.', indent_after=True)
-            result = self.return_expression()
-            verbose_print('Return expression produced {0}'.format(str(result)), outdent_before=True)
-        return result
+            return self._return_clause()
 
 
     def _push_global_variables(self):
         for let in self.global_variables:
-            verbose_print('Evaluating let {0} := <expr>'.format(let[0]))
-            push_variable(let[0], let[1]())
+            push_variable(let[0], let[2]())
+
+
+    def _push_invariant_variables(self):
+        for let in self.invariant_variables:
+            push_variable(let[0], let[2]())
 
 
     def _push_iteration_variables(self):
         for let in self.per_iteration_variables:
-            verbose_print('Evaluating let {0} := <expr>'.format(let[0]))
-            push_variable(let[0], let[1]())
+            push_variable(let[0], let[2]())
+
+
+    def _entry_message(self):
+        return 'Evaluating FLWOR {0}'.format(self)
+
+
+    def _exit_message(self, result):
+        return 'FLWOR evaluation completed; returning {0}'.format(debug_dump_anything(result))
+
+
+    def _is_loop_invariant(self, variable_name, expression_fn):
+        # The context node doesn't change from one iteration to the next, so only the iteration variable and the lets
+        # that depend on it can give a let a different value each time around. A let that would shadow one of those
+        # keeps its place in the loop so that names resolve the same way they would without hoisting.
+        varying_names = {self.sequence_variable}
+        varying_names.update(let[0] for let in self.per_iteration_variables)
+        return variable_name not in varying_names and is_variable_free(expression_fn, varying_names)
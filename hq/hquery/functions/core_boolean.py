@@ -1,21 +1,23 @@
 from math import isnan
 
-from hq.hquery.object_type import is_node_set, is_number, is_boolean
+from hq.hquery.object_type import is_number, is_boolean
 
 
 exports = ('boolean', 'false', 'not_', 'true')
 
 
 class boolean:
+    __slots__ = ('value',)
 
-    def __init__(self, obj):
-        if is_node_set(obj):
-            self.value = len(obj) > 0
+    def __new__(cls, obj):
+        if isinstance(obj, list):
+            value = len(obj) > 0
         elif is_number(obj):
             f = float(obj)
-            self.value = bool(f) and not isnan(f)
+            value = bool(f) and not isnan(f)
         else:
-            self.value = bool(obj)
+            value = bool(obj)
+        return _true if value else _false
 
     def __bool__(self):
         return self.value
@@ -32,9 +34,19 @@ class boolean:
     def __repr__(self):
         return 'boolean({0})'.format(self.value)
 
+    @classmethod
+    def _singleton(cls, value):
+        result = object.__new__(cls)
+        result.value = value
+        return result
+
+
+_true = boolean._singleton(True)
+_false = boolean._singleton(False)
+
 
 def false():
-    return boolean(False)
+    return _false
 
 
 def not_(value):
@@ -42,4 +54,4 @@ def not_(value):
 
 
 def true():
-    return boolean(True)
+    return _true
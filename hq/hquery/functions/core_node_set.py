@@ -3,7 +3,7 @@ from hq.hquery.expression_context import peek_context, get_context_node
 from hq.hquery.functions.core_number import number
 from hq.hquery.object_type import string_value, is_sequence, object_type_name
 from hq.hquery.sequences import make_node_set
-from hq.soup_util import root_tag_from_any_tag, is_tag_node
+from hq.soup_util import id_index, is_tag_node, soup_from_any_tag
 
 exports = ('count', 'id', 'last', 'name', 'position')
 
@@ -18,11 +18,8 @@ def id(ids):
         ids = set(string_value(item) for item in ids)
     else:
         ids = set(string_value(ids).split())
-    result = []
-    for node in root_tag_from_any_tag(get_context_node()).descendants:
-        if is_tag_node(node) and 'id' in node.attrs and node['id'] in ids:
-            result.append(node)
-    return make_node_set(result)
+    index = id_index(soup_from_any_tag(get_context_node()))
+    return make_node_set([node for value in ids for node in index.get(value, ())])
 
 
 def last():
@@ -8,20 +8,28 @@ from hq.hquery.sequences import make_sequence
 exports = ('ceiling', 'floor', 'number', 'round_', 'sum')
 
 
+SMALL_INTEGER_RANGE = range(-5, 1025)
+
+
 class number:
+    __slots__ = ('value',)
 
-    def __init__(self, obj):
+    def __new__(cls, obj):
         if isinstance(obj, number):
-            self.value = obj.value
+            return obj
         elif is_boolean(obj):
-            self.value = 1 if obj else 0
+            value = 1 if obj else 0
         elif is_node_set(obj) or is_any_node(obj):
-            self.value = self._int_or_float(float(string_value(obj)))
+            value = cls._int_or_float(float(string_value(obj)))
         else:
             try:
-                self.value = self._int_or_float(float(obj))
+                value = cls._int_or_float(float(obj))
             except ValueError:
-                self.value = float('nan')
+                value = float('nan')
+
+        if value.__class__ is int and value in SMALL_INTEGER_RANGE:
+            return _small_integers[value - SMALL_INTEGER_RANGE.start]
+        return cls._make(value)
 
     def __float__(self):
         return float(self.value)
@@ -81,6 +89,12 @@ class number:
     def __repr__(self):
         return 'number({0})'.format(str(self.value))
 
+    @classmethod
+    def _make(cls, value):
+        result = object.__new__(cls)
+        result.value = value
+        return result
+
     @staticmethod
     def _int_or_float(numeric_value):
         if isinstance(numeric_value, int) or numeric_value % 1 != 0:
@@ -93,6 +107,9 @@ class number:
         return other.value if is_number(other) else other
 
 
+_small_integers = tuple(number._make(value) for value in SMALL_INTEGER_RANGE)
+
+
 def ceiling(value):
     return number(math.ceil(value.value))
 
@@ -1,6 +1,7 @@
 from hq.hquery.evaluation_error import HqueryEvaluationError
 from hq.hquery.expression_context import get_context_node, peek_context
 from hq.hquery.functions.core_boolean import boolean
+from hq.soup_util import has_css_class
 
 exports = ('class_', 'even', 'odd')
 
@@ -16,7 +17,7 @@ def class_(*args):
     else:
         raise HqueryEvaluationError('class() expects one or two arguments; got {0}'.format(len(args)))
 
-    return boolean(name in tag['class'])
+    return boolean(has_css_class(tag, name))
 
 
 def even():
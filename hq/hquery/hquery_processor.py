@@ -1,17 +1,35 @@
 import re
+from functools import lru_cache
 
 from hq.hquery.computed_constructors.html_attribute import ComputedHtmlAttributeConstructor
 from hq.hquery.computed_constructors.html_element import ComputedHtmlElementConstructor
 from hq.hquery.computed_constructors.json_array import ComputedJsonArrayConstructor
 from hq.hquery.computed_constructors.json_hash import ComputedJsonHashConstructor
-from hq.hquery.evaluation_in_context import evaluate_in_context
-from hq.hquery.location_path import LocationPath
+from hq.hquery.evaluation_in_context import evaluate_in_context, iterate_in_context
+from hq.hquery.expression_traits import set_traits, traits_of, any_uses_position, any_uses_context, variables_of
+from hq.hquery.location_path import LocationPath, as_existence_test, EXISTENCE_TEST_REWRITE
+from hq.hquery.query_plan import PlanNode, plan_of, set_plan
 
 from .tokens import *
-from ..soup_util import debug_dump_long_string
+from ..config import settings
+from ..soup_util import debug_dump_long_string, derived_text_cache_info
 from ..verbosity import verbose_print
 
 
+def _describe_derived_text_cache_use(before, after):
+    hits = after.hits - before.hits
+    lookups = hits + after.misses - before.misses
+    return 'String value cache: {0} hits in {1} lookups ({2:.0%} hit rate)'.format(hits,
+                                                                                 lookups,
+                                                                                 hits / lookups if lookups else 0)
+
+
+def _condition_rewrites(condition, condition_test):
+    if condition_test is condition:
+        return []
+    return [EXISTENCE_TEST_REWRITE]
+
+
 def _is_name_test_predecessor(token):
     return any(isinstance(token, clazz) for clazz in (AxisToken, SlashToken, DoubleSlashToken))
 
@@ -124,6 +142,28 @@ token_config = [
     (r'(\w[\w\-]*)', NameTestToken),
 ]
 
+token_pattern = re.compile(r'\s*(?:{0})'.format('|'.join([pattern for pattern, _ in token_config])))
+
+EXPRESSION_CACHE_SIZE = 512
+
+
+def clear_expression_cache():
+    _compile_cached.cache_clear()
+
+
+def compile_hquery(source, preserve_space=False):
+    # Whether the compiled closures are traced and profiled is decided at compile time, so it's part of the key.
+    return _compile_cached(source, bool(preserve_space), bool(settings.VERBOSE), bool(settings.PROFILE))
+
+
+def expression_cache_info():
+    return _compile_cached.cache_info()
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def _compile_cached(source, preserve_space, verbose, profile):
+    return HqueryProcessor(source, preserve_space).parse()
+
 
 class ParseInterface:
 
@@ -155,7 +195,7 @@ class ParseInterface:
         return self.processor.parse_location_path(first_token, root_expression=root_expression)
 
     def parse_in_new_processor(self, source):
-        return HqueryProcessor(source).parse()
+        return compile_hquery(source)
 
     def peek(self):
         return self.processor.token
@@ -173,21 +213,45 @@ class HqueryProcessor():
         self.preserve_space = preserve_space
 
 
+    def explain(self):
+        """Compile the query without evaluating it and return its plan, a tree of PlanNodes showing the steps,
+        predicates, operators and clauses it was compiled to and the rewrites applied to them."""
+        return plan_of(self._compile_for_query())
+
+
     def query(self, starting_node):
-        verbose_print(u'PARSING HQUERY "{0}"'.format(debug_dump_long_string(self.source)), indent_after=True)
-        expression_fn = self.parse()
+        expression_fn = self._compile_for_query()
         verbose_print('EVALUATING HQUERY', indent_after=True, outdent_before=True)
+        text_cache_before = derived_text_cache_info()
         result = evaluate_in_context(starting_node, expression_fn, preserve_space=self.preserve_space)
         verbose_print('HQUERY FINISHED', outdent_before=True)
+        verbose_print(lambda: _describe_derived_text_cache_use(text_cache_before, derived_text_cache_info()))
         return result
 
 
+    def query_items(self, starting_node):
+        """Like query(), but yield the result's items one at a time, streaming a top-level FLWOR or sequence."""
+        expression_fn = self._compile_for_query()
+        verbose_print('EVALUATING HQUERY (STREAMING RESULTS)', indent_after=True, outdent_before=True)
+        text_cache_before = derived_text_cache_info()
+        for item in iterate_in_context(starting_node, expression_fn, preserve_space=self.preserve_space):
+            yield item
+        verbose_print('HQUERY FINISHED', outdent_before=True)
+        verbose_print(lambda: _describe_derived_text_cache_use(text_cache_before, derived_text_cache_info()))
+
+
+    def _compile_for_query(self):
+        verbose_print(u'PARSING HQUERY "{0}"'.format(debug_dump_long_string(self.source)), indent_after=True)
+        expression_fn = compile_hquery(self.source, self.preserve_space)
+        verbose_print(lambda: 'Compiled expression cache: {0}'.format(expression_cache_info()))
+        return expression_fn
+
+
     def tokenize(self):
         parse_interface = ParseInterface(self)
-        pattern = re.compile(r'\s*(?:{0})'.format('|'.join([pattern for pattern, _ in token_config])))
         previous_token = None
 
-        for matches in pattern.findall(self.source):
+        for matches in token_pattern.findall(self.source):
             index, value = next((i, group) for i, group in enumerate(list(matches)) if bool(group))
             if value is None:
                 raise SyntaxError("unknown token")
@@ -206,7 +270,7 @@ class HqueryProcessor():
         result = None
 
         if self.token_is(expected_classes):
-            verbose_print('ParseInterface advancing over token {0}'.format(self.token))
+            verbose_print(lambda: 'ParseInterface advancing over token {0}'.format(self.token))
             result = self.token
             self.token = self.next_token()
 
@@ -310,13 +374,26 @@ class HqueryProcessor():
         else_expr = self.expression()
         verbose_print('Finished parsing if/then/else', outdent_before=True)
 
+        condition_test = as_existence_test(condition)
+
         def evaluate():
-            if boolean(condition()):
+            if boolean(condition_test()):
                 return then_expr()
             else:
                 return else_expr()
 
-        return evaluate
+        set_plan(evaluate,
+                 'if/then/else',
+                 [PlanNode('if', [condition_test], _condition_rewrites(condition, condition_test)),
+                  PlanNode('then', [then_expr]),
+                  PlanNode('else', [else_expr])])
+
+        then_type = traits_of(then_expr).result_type
+        return set_traits(evaluate,
+                          then_type if then_type == traits_of(else_expr).result_type else None,
+                          uses_position=any_uses_position(condition, then_expr, else_expr),
+                          uses_context=any_uses_context(condition, then_expr, else_expr),
+                          variables=variables_of(condition, then_expr, else_expr))
 
 
     def parse_flwor(self, first_token):
@@ -475,14 +552,14 @@ class HqueryProcessor():
 
     def expression(self, rbp=LBP.nothing):
         t = self.token
-        verbose_print(u'parsing expression starting with {0} (RBP={1})'.format(t, rbp), indent_after=True)
+        verbose_print(lambda: u'parsing expression starting with {0} (RBP={1})'.format(t, rbp), indent_after=True)
         try:
 
             self.token = self.next_token()
             left = t.nud()
             while rbp < self.token.lbp:
                 t = self.token
-                verbose_print('continuing expression at {0} (LBP={1})'.format(t, self.token.lbp))
+                verbose_print(lambda: 'continuing expression at {0} (LBP={1})'.format(t, self.token.lbp))
                 self.token = self.next_token()
                 left = t.led(left)
             verbose_print('finished expression', outdent_before=True)
@@ -1,12 +1,19 @@
 from hq.hquery.axis import Axis
+from hq.hquery.expression_traits import ExpressionTraits, any_uses_position, any_uses_context, is_context_free, \
+    is_non_positional_predicate, position_selector_of, variables_of, LAST_POSITION
+from hq.hquery.query_plan import PlanNode
 from hq.hquery.syntax_error import HquerySyntaxError
 from hq.soup_util import debug_dump_node, soup_from_any_tag, debug_dump_long_string
-from hq.verbosity import verbose_print
+from hq.profiling import profiled
+from hq.verbosity import traced, verbose_print
 from hq.hquery.expression_context import get_context_node, peek_context
 from hq.hquery.evaluation_in_context import evaluate_across_contexts, evaluate_in_context
+from hq.hquery.equality_operators import make_equality_probe
+from hq.hquery.evaluation_error import HqueryEvaluationError
+from hq.hquery.functions.core_boolean import boolean
 from hq.hquery.functions.core_number import number
-from hq.hquery.object_type import is_number
-from hq.hquery.sequences import make_node_set
+from hq.hquery.object_type import is_number, SEQUENCE
+from hq.hquery.sequences import make_node_set, make_node_set_in_axis_order, NodeSet
 
 
 class LocationPath:
@@ -19,6 +26,20 @@ class LocationPath:
         if self.absolute and self.root_expression is not None:
             raise HquerySyntaxError('internal error forming location path; it looks both rooted and absolute')
 
+        self._select = traced(self._select,
+                              lambda: 'Evaluating location path {0}'.format(self.debug_dump()),
+                              lambda result: 'Evaluation completed; location path selected {0} nodes'.format(
+                                  len(result)))
+        self._any_selected = traced(self._any_selected,
+                                    lambda: 'Testing whether location path {0} selects any nodes'.format(
+                                        self.debug_dump()),
+                                    lambda result: 'Existence test completed; location path {0} nodes'.format(
+                                        'found' if result else 'found no'))
+        self._evaluate_steps = traced(self._evaluate_steps,
+                                      lambda remaining_steps: 'Evaluating step {0}'.format(remaining_steps[0]),
+                                      lambda result: 'Step evaluation completed; returning {0} nodes.'.format(
+                                          len(result)))
+
 
     def __len__(self):
         return len(self.steps)
@@ -33,77 +54,343 @@ class LocationPath:
     def append_step(self, axis, node_test, predicates):
         if axis == Axis.css_class and not node_test.is_name_test:
             raise HquerySyntaxError('CSS class axis must be followed by a name test, not a node test')
-        self.steps.append(LocationPathStep(axis, node_test, predicates))
+
+        if self._can_fuse_with_previous_step(axis, predicates):
+            verbose_print(lambda: 'Fusing {0} with {1}::{2} into a single step'.format(self.steps[-1],
+                                                                                       axis.name,
+                                                                                       repr(node_test)))
+            self.steps[-1] = self._profiled_step(LocationPathStep(axis, node_test, predicates, from_descendants=True))
+        else:
+            self.steps.append(self._profiled_step(LocationPathStep(axis, node_test, predicates)))
 
 
     def debug_dump(self):
         return debug_dump_long_string(str(self))
 
 
-    def evaluate(self):
-        verbose_print(lambda: 'Evaluating location path {0}'.format(self.debug_dump()), indent_after=True)
+    @property
+    def hq_traits(self):
+        predicates = [predicate for step in self.steps for predicate in step.predicates]
+        if self.root_expression is not None:
+            return ExpressionTraits(SEQUENCE,
+                                    uses_position=any_uses_position(self.root_expression),
+                                    uses_context=any_uses_context(self.root_expression),
+                                    variables=variables_of(self.root_expression, *predicates))
+        else:
+            return ExpressionTraits(SEQUENCE,
+                                    uses_position=False,
+                                    uses_context=not self.absolute,
+                                    variables=variables_of(*predicates))
 
+
+    @property
+    def hq_plan(self):
         if self.absolute:
-            verbose_print('Switching context to root because this path is absolute.')
-            results = evaluate_in_context(soup_from_any_tag(get_context_node()),
-                                          lambda: self._evaluate_steps(self.steps))
+            return PlanNode('absolute location path', [step.plan(index + 1) for index, step in enumerate(self.steps)])
         elif self.root_expression is not None:
-            results = evaluate_across_contexts(self.root_expression(), lambda: self._evaluate_steps(self.steps))
+            return PlanNode('location path from expression',
+                            [PlanNode('context nodes', [self.root_expression])] +
+                            [step.plan(index + 1) for index, step in enumerate(self.steps)])
         else:
-            results = self._evaluate_steps(self.steps)
+            return PlanNode('relative location path', [step.plan(index + 1) for index, step in enumerate(self.steps)])
 
-        verbose_print('Evaluation completed; location path selected {0} nodes'.format(len(results)),
-                      outdent_before=True)
-        return make_node_set(results, reverse=False)
 
+    def evaluate(self):
+        return make_node_set(self._select(), reverse=False)
 
-    def _evaluate_steps(self, remaining_steps):
+
+    def exists(self):
+        """Evaluate the path only as far as it takes to find out whether it selects any nodes at all."""
+        return boolean(self._any_selected())
+
+
+    def _any_selected(self):
+        if self.absolute:
+            return evaluate_in_context(soup_from_any_tag(get_context_node()), lambda: self._any_in_steps(self.steps))
+        elif self.root_expression is not None:
+            root_set = self.root_expression()
+            HqueryEvaluationError.must_be_node_set(root_set)
+            return any(evaluate_in_context(node, lambda: self._any_in_steps(self.steps)) for node in root_set)
+        else:
+            return self._any_in_steps(self.steps)
+
+
+    def _any_in_steps(self, remaining_steps):
         step = remaining_steps[0]
-        verbose_print(lambda: 'Evaluating step {0}'.format(remaining_steps[0]), indent_after=True)
 
-        result_set = make_node_set(step.node_test.apply(step.axis, get_context_node()),
-                                   reverse=step.axis.is_reverse_order())
-        verbose_print(lambda: 'Axis and node test produced {0} matching nodes'.format(len(result_set)))
+        if step.filters_lazily:
+            candidates = (node for node in step.iterate(get_context_node())
+                          if all(evaluate_in_context(node, predicate) for predicate in step.predicate_fns))
+        else:
+            candidates = step.select(get_context_node())
 
-        for index, expression_fn in enumerate(step.predicates):
-            def accept_context_node():
-                context = peek_context()
+        if len(remaining_steps) == 1:
+            return next(iter(candidates), None) is not None
+        else:
+            return any(evaluate_in_context(node, lambda: self._any_in_steps(remaining_steps[1:]))
+                       for node in candidates)
 
-                format_str = u'Evaluating predicate expression for context node at position {0} of {1}: {2}.'
-                verbose_print(lambda: format_str.format(context.position, context.size, debug_dump_node(context.node)))
 
-                value = expression_fn()
-                if is_number(value):
-                    accept = number(context.position) == value
-                else:
-                    accept = bool(value)
+    def _select(self):
+        if self.absolute:
+            return evaluate_in_context(soup_from_any_tag(get_context_node()), lambda: self._evaluate_steps(self.steps))
+        elif self.root_expression is not None:
+            return evaluate_across_contexts(self.root_expression(), lambda: self._evaluate_steps(self.steps))
+        else:
+            return self._evaluate_steps(self.steps)
 
-                verbose_print(lambda: u'{0} node {1}'.format('Accepted' if accept else 'Rejected',
-                                                             debug_dump_node(context.node)))
-                return [context.node] if accept else []
 
-            verbose_print(lambda: 'Evaluating predicate #{0} against {1} nodes'.format(index + 1, len(result_set)),
-                          indent_after=True)
-            result_set = evaluate_across_contexts(result_set, accept_context_node)
-            verbose_print(
-                lambda: 'Evaluation of predicate #{0} complete; accepted {1} nodes.'.format(index + 1, len(result_set)),
-                outdent_before=True)
+    def _evaluate_steps(self, remaining_steps):
+        result_set = remaining_steps[0].select(get_context_node())
 
         if len(remaining_steps) > 1:
             result_set = evaluate_across_contexts(result_set, lambda: self._evaluate_steps(remaining_steps[1:]))
 
-        verbose_print(lambda: 'Step evaluation completed; returning {0} nodes.'.format(len(result_set)),
-                      outdent_before=True)
         return result_set
 
 
+    def _profiled_step(self, step):
+        def describe_step():
+            return u'{0} of {1}'.format(step, self.debug_dump())
+
+        step.select = profiled(step.select, 'step', describe_step, count_in=lambda node: 1)
+        step.predicate_filters = [profiled(predicate_filter,
+                                           'predicate',
+                                           lambda index=index: u'#{0} of {1}'.format(index + 1, describe_step()),
+                                           count_in=len)
+                                  for index, predicate_filter in enumerate(step.predicate_filters)]
+        return step
+
+
+    def _can_fuse_with_previous_step(self, axis, predicates):
+        if len(self.steps) == 0 or axis not in _axes_fusable_with_descendant_or_self:
+            return False
+        previous = self.steps[-1]
+        if len(predicates) > 0 and axis != Axis.attribute and position_selector_of(predicates[0]) is not None:
+            # A leading [n] or [last()] still picks per parent, which a fused step can do by grouping on parents.
+            predicates = predicates[1:]
+        return (previous.axis == Axis.descendant_or_self and
+                repr(previous.node_test) == 'node()' and
+                len(previous.predicates) == 0 and
+                not previous.from_descendants and
+                all(is_non_positional_predicate(predicate) for predicate in predicates))
+
+
 
 class LocationPathStep:
 
-    def __init__(self, axis, node_test, predicates):
+    def __init__(self, axis, node_test, predicates, from_descendants=False):
         self.axis = axis
         self.node_test = node_test
         self.predicates = predicates
+        self.from_descendants = from_descendants
+        self.position_selectors = [position_selector_of(predicate) for predicate in predicates]
+        self.leading_position_selector = self.position_selectors[0] if len(predicates) > 0 else None
+        self.predicate_fns = [as_existence_test(predicate) for predicate in predicates]
+        self.hash_joins = [HashJoin.find_in(predicate) for predicate in predicates]
+        self.filters_lazily = all(is_non_positional_predicate(predicate) for predicate in predicates)
+        self.predicate_filters = [self._make_predicate_filter(index) for index in range(len(predicates))]
 
     def __str__(self):
-        return '{0}::{1}{2}'.format(self.axis.name, repr(self.node_test), '[predicate]' * len(self.predicates))
+        return '{0}{1}::{2}{3}'.format('descendant_or_self::node()/' if self.from_descendants else '',
+                                       self.axis.name,
+                                       repr(self.node_test),
+                                       '[predicate]' * len(self.predicates))
+
+    def plan(self, number):
+        rewrites = []
+        if self.from_descendants:
+            rewrites.append('fused with the descendant_or_self::node() step before it')
+        index_used = self.node_test.index_used(self.axis, self.from_descendants)
+        if index_used is not None:
+            rewrites.append('nodes looked up in the document\'s {0} instead of walking the axis'.format(index_used))
+        return PlanNode('step {0}: {1}::{2}'.format(number, self.axis.name, repr(self.node_test)),
+                        [self._predicate_plan(index) for index in range(len(self.predicates))],
+                        rewrites)
+
+    def select(self, node):
+        """Return the node set this step selects from node: its axis and node test, filtered by its predicates."""
+        if self.leading_position_selector is not None:
+            result_set = self.apply_at_position(node)
+            first_filter = 1
+        else:
+            result_set = self.apply_as_node_set(node)
+            first_filter = 0
+
+        for index in range(first_filter, len(self.predicate_filters)):
+            if len(result_set) == 0:
+                break
+            result_set = self.predicate_filters[index](result_set)
+
+        return result_set
+
+    def apply(self, node):
+        return list(self.iterate(node))
+
+    def iterate(self, node):
+        if self.from_descendants:
+            return self.node_test.iterate_from_descendants_or_self(self.axis, node)
+        else:
+            return self.node_test.iterate(self.axis, node)
+
+    def apply_as_node_set(self, node):
+        nodes = self.apply(node)
+        reverse = self.axis.is_reverse_order()
+        if self.axis in _axes_gathered_out_of_order:
+            return make_node_set(nodes, reverse=reverse)
+        else:
+            return make_node_set_in_axis_order(nodes, reverse=reverse)
+
+    def apply_at_position(self, node):
+        selector = self.leading_position_selector
+        if self.from_descendants:
+            return select_position_among_siblings(self.apply(node), selector)
+        elif selector is LAST_POSITION or self.axis in _axes_gathered_out_of_order:
+            return select_position(self.apply_as_node_set(node), selector)
+
+        position = _position_to_int(selector)
+        if position is None:
+            return NodeSet()
+        return NodeSet(self.node_test.apply_at_position(self.axis, node, position))
+
+    def _predicate_plan(self, index):
+        rewrites = []
+        selector = self.position_selectors[index]
+        if selector is not None:
+            if index == 0 and self.from_descendants:
+                rewrites.append('position picked among each parent\'s children, not evaluated for each node')
+            elif index == 0 and selector is not LAST_POSITION and self.axis not in _axes_gathered_out_of_order:
+                rewrites.append('axis walked only as far as the position, not evaluated for each node')
+            else:
+                rewrites.append('position picked directly, not evaluated for each node')
+        elif is_context_free(self.predicate_fns[index]):
+            rewrites.append('context free, so evaluated once per step instead of once per node')
+        elif self.hash_joins[index] is not None:
+            rewrites.append('hash join; the context-free side of "{0}" is evaluated and hashed once per step'.format(
+                self.hash_joins[index].operator))
+        if self.predicate_fns[index] is not self.predicates[index]:
+            rewrites.append(EXISTENCE_TEST_REWRITE)
+        return PlanNode('predicate {0}'.format(index + 1), [self.predicate_fns[index]], rewrites)
+
+    def _make_predicate_filter(self, index):
+        expression_fn = self.predicate_fns[index]
+        position_selector = self.position_selectors[index]
+        hash_join = self.hash_joins[index]
+
+        if position_selector is not None:
+            return lambda node_set: select_position(node_set, position_selector)
+        elif is_context_free(expression_fn):
+            return lambda node_set: _apply_context_free_predicate(node_set, expression_fn)
+        elif hash_join is not None:
+            return lambda node_set: evaluate_across_contexts(node_set, _context_node_acceptor(hash_join.bind()))
+        else:
+            accept_context_node = _context_node_acceptor(expression_fn)
+            return lambda node_set: evaluate_across_contexts(node_set, accept_context_node)
+
+
+class HashJoin:
+    """An = or != predicate whose context-free side is evaluated and hashed once per step, then probed per node."""
+
+    def __init__(self, operator, varying_fn, fixed_fn):
+        self.operator = operator
+        self.varying_fn = varying_fn
+        self.fixed_fn = fixed_fn
+
+    @classmethod
+    def find_in(cls, predicate):
+        operands = getattr(predicate, 'equality_operands', None)
+        if operands is None:
+            return None
+
+        operator, left, right = operands
+        if is_context_free(right) and not is_context_free(left):
+            return HashJoin(operator, left, right)
+        elif is_context_free(left) and not is_context_free(right):
+            return HashJoin(operator, right, left)
+        else:
+            return None
+
+    def bind(self):
+        probe = make_equality_probe(self.fixed_fn())
+        varying_fn = self.varying_fn
+
+        if self.operator == '=':
+            return lambda: probe(varying_fn())
+        else:
+            return lambda: boolean(not probe(varying_fn()))
+
+
+def _context_node_acceptor(expression_fn):
+    """Keep the context node when the predicate is true or, for a number, equal to the node's position."""
+    def accept_context_node():
+        context = peek_context()
+        value = expression_fn()
+        if is_number(value):
+            accept = number(context.position) == value
+        else:
+            accept = bool(value)
+        return [context.node] if accept else []
+
+    return traced(accept_context_node,
+                  lambda: u'Evaluating predicate for context node at position {0} of {1}: {2}.'.format(
+                      peek_context().position, peek_context().size, debug_dump_node(get_context_node())),
+                  lambda result: u'{0} node'.format('Accepted' if len(result) else 'Rejected'))
+
+
+EXISTENCE_TEST_REWRITE = 'location path only tested for existence; it stops at the first node it finds'
+
+
+def as_existence_test(expression_fn):
+    """Swap a location path's evaluate for its exists, where only the boolean value matters."""
+    path = getattr(expression_fn, '__self__', None)
+    if isinstance(path, LocationPath) and expression_fn == path.evaluate:
+        return path.exists
+    else:
+        return expression_fn
+
+
+def select_position(node_set, selector):
+    """Pick the position a constant numeric (or last()) predicate selects, without evaluating it per node."""
+    if selector is LAST_POSITION:
+        position = len(node_set)
+    else:
+        position = _position_to_int(selector)
+
+    if position is None or position < 1 or position > len(node_set):
+        return NodeSet()
+    return NodeSet([node_set[position - 1]])
+
+
+def select_position_among_siblings(nodes, selector):
+    """Like select_position, but applied separately to each group of nodes sharing a parent."""
+    siblings_by_parent = dict()
+    for node in nodes:
+        siblings = siblings_by_parent.get(id(node.parent))
+        if siblings is None:
+            siblings = siblings_by_parent[id(node.parent)] = []
+        siblings.append(node)
+
+    selected = set()
+    for siblings in siblings_by_parent.values():
+        selected.update(id(node) for node in select_position(siblings, selector))
+    return NodeSet(node for node in nodes if id(node) in selected)
+
+
+def _apply_context_free_predicate(node_set, expression_fn):
+    value = expression_fn()
+    if is_number(value):
+        return select_position(node_set, value)
+    else:
+        return make_node_set(node_set) if value else NodeSet()
+
+
+def _position_to_int(selector):
+    value = float(selector)
+    if value.is_integer() and value >= 1:
+        return int(value)
+    else:
+        return None
+
+
+_axes_fusable_with_descendant_or_self = {Axis.attribute, Axis.child, Axis.css_class}
+_axes_gathered_out_of_order = {Axis.preceding}
@@ -1,7 +1,9 @@
+from itertools import chain, islice
+
 from hq.hquery.axis import Axis
 
 from ..soup_util import is_root_node, is_tag_node, is_text_node, AttributeNode, is_attribute_node, is_any_node, root_tag_from_soup, \
-    is_comment_node
+    is_comment_node, descendants_by_css_class, descendants_by_tag_name
 
 
 def _accept_principal_node_type(node, axis=None):
@@ -24,10 +26,16 @@ def _make_name_accept_fn(value):
     return evaluate
 
 
+_tag_name_indexed_axes = {Axis.descendant, Axis.descendant_or_self}
+_descendant_lookups = {Axis.child: descendants_by_tag_name, Axis.css_class: descendants_by_css_class}
+_descendant_lookup_names = {Axis.child: 'tag name index', Axis.css_class: 'CSS class index'}
+
+
 class NodeTest:
 
     def __init__(self, value, name_test=False):
         value = value.lower()
+        self.value = value
         self.repr = value
         self.is_name_test = name_test
 
@@ -50,34 +58,103 @@ class NodeTest:
 
 
     def apply(self, axis, node):
+        return list(self.iterate(axis, node))
+
+
+    def apply_at_position(self, axis, node, position):
+        return list(islice(self.iterate(axis, node), position - 1, position))
+
+
+    def apply_from_descendants_or_self(self, axis, node):
+        return list(self.iterate_from_descendants_or_self(axis, node))
+
+
+    def index_used(self, axis, from_descendants=False):
+        """Name the per-document index iterate (or iterate_from_descendants_or_self) looks nodes up in for the axis,
+        or return None if it walks the axis instead."""
+        if not self.is_name_test:
+            return None
+        elif from_descendants:
+            return _descendant_lookup_names.get(axis)
+        elif axis in _tag_name_indexed_axes:
+            return 'tag name index'
+        else:
+            return None
+
+
+    def iterate(self, axis, node):
+        if self.is_name_test and axis in _tag_name_indexed_axes:
+            indexed = self._apply_tag_name_index(axis, node)
+            if indexed is not None:
+                return iter(indexed)
+
         nodes = getattr(self, 'gather_{0}'.format(axis.name))(node)
-        return [node for node in nodes if self.accept_fn(node, axis=axis)]
+        return (node for node in nodes if self.accept_fn(node, axis=axis))
+
+
+    def iterate_from_descendants_or_self(self, axis, node):
+        if axis == Axis.attribute:
+            nodes = self.gather_attributes_of_descendants_or_self(node)
+        else:
+            if self.is_name_test and axis in _descendant_lookups:
+                indexed = self._children_of_descendants_or_self_by_index(axis, node)
+                if indexed is not None:
+                    return iter(indexed)
+            nodes = self.gather_children_of_descendants_or_self(node)
+        return (node for node in nodes if self.accept_fn(node, axis=axis))
+
+
+    def _apply_tag_name_index(self, axis, node):
+        descendants = descendants_by_tag_name(node, self.value)
+        if descendants is not None and axis == Axis.descendant_or_self and self.accept_fn(node, axis=axis):
+            descendants = [node] + descendants
+        return descendants
+
+
+    def _children_of_descendants_or_self_by_index(self, axis, node):
+        descendants = _descendant_lookups[axis](node, self.value)
+        if descendants is not None and is_root_node(node):
+            root_tag = root_tag_from_soup(node)
+            descendants = [tag for tag in descendants if tag.parent is not node or tag is root_tag]
+        return descendants
 
 
     def gather_ancestor(self, node):
         if hasattr(node, 'parents'):
-            return list(node.parents)
+            return node.parents
         else:
-            return []
+            return ()
 
 
     def gather_ancestor_or_self(self, node):
-        result = self.gather_self(node)
-        result.extend(self.gather_ancestor(node))
-        return result
+        return chain(self.gather_self(node), self.gather_ancestor(node))
 
 
     def gather_attribute(self, node):
-        return list(AttributeNode.enumerate(node))
+        return AttributeNode.enumerate(node)
 
 
     def gather_child(self, node):
         if is_root_node(node):
-            return [root_tag_from_soup(node)]
+            return (root_tag_from_soup(node),)
         elif is_tag_node(node):
             return node.contents
         else:
-            return []
+            return ()
+
+
+    def gather_children_of_descendants_or_self(self, node):
+        if is_root_node(node):
+            return chain(self.gather_child(node), (d for d in node.descendants if d.parent is not node))
+        else:
+            return self.gather_descendant(node) if is_tag_node(node) else ()
+
+
+    def gather_attributes_of_descendants_or_self(self, node):
+        if is_root_node(node) or is_tag_node(node):
+            yield from AttributeNode.enumerate(node)
+            for descendant in node.descendants:
+                yield from AttributeNode.enumerate(descendant)
 
 
     def gather_css_class(self, node):
@@ -86,57 +163,51 @@ class NodeTest:
 
     def gather_descendant(self, node):
         if hasattr(node, 'descendants'):
-            return list(node.descendants)
+            return node.descendants
         else:
-            return []
+            return ()
 
 
     def gather_descendant_or_self(self, node):
-        result = self.gather_self(node)
-        result.extend(self.gather_descendant(node))
-        return result
+        return chain(self.gather_self(node), self.gather_descendant(node))
 
 
     def gather_following(self, node):
-        result = []
         while is_tag_node(node):
             for sibling in node.next_siblings:
-                result.append(sibling)
-                result.extend(self.gather_descendant(sibling))
+                yield sibling
+                yield from self.gather_descendant(sibling)
             node = node.parent
-        return result
 
 
     def gather_following_sibling(self, node):
         if hasattr(node, 'next_siblings'):
-            return list(node.next_siblings)
+            return node.next_siblings
         else:
-            return []
+            return ()
 
 
     def gather_parent(self, node):
         if hasattr(node, 'parent') and node.parent is not None:
-            return [node.parent]
+            return (node.parent,)
         else:
-            return []
+            return ()
 
 
     def gather_preceding(self, node):
-        result = []
         while is_tag_node(node):
             for sibling in node.previous_siblings:
-                result.append(sibling)
-                result.extend(self.gather_descendant(sibling))
+                yield sibling
+                yield from self.gather_descendant(sibling)
             node = node.parent
-        return result
 
 
     def gather_preceding_sibling(self, node):
         if hasattr(node, 'previous_siblings'):
-            return list(node.previous_siblings)
+            return node.previous_siblings
         else:
-            return []
+            return ()
 
 
     def gather_self(self, node):
-        return [node]
+        return (node,)
@@ -41,7 +41,7 @@ def is_hash(obj):
 
 
 def is_node_set(obj):
-    return isinstance(obj, list) and all(is_any_node(x) for x in obj)
+    return obj.__class__.__name__ == 'NodeSet' or isinstance(obj, list) and all(is_any_node(x) for x in obj)
 
 
 def is_number(obj):
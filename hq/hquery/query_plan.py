@@ -0,0 +1,34 @@
+class PlanNode:
+    """A piece of a compiled query, the rewrites applied to it, and its operands (plans or expression functions)."""
+
+    def __init__(self, label, operands=(), rewrites=()):
+        self.label = label
+        self.operands = tuple(operand for operand in operands if operand is not None)
+        self.rewrites = tuple(rewrites)
+
+    def __str__(self):
+        return self.render()
+
+    @property
+    def children(self):
+        return [operand if isinstance(operand, PlanNode) else plan_of(operand) for operand in self.operands]
+
+    def render(self, indent=0):
+        lines = [u'{0}{1}'.format(' ' * indent, self.label)]
+        lines.extend(u'{0}  [rewrite] {1}'.format(' ' * indent, rewrite) for rewrite in self.rewrites)
+        lines.extend(child.render(indent + 2) for child in self.children)
+        return '\n'.join(lines)
+
+
+def plan_of(expression_fn):
+    """Return the plan set on an expression's closure, or the hq_plan of the object behind a bound method."""
+    holder = getattr(expression_fn, '__self__', expression_fn)
+    plan = getattr(holder, 'hq_plan', None)
+    if plan is None:
+        return PlanNode('<{0}>'.format(getattr(expression_fn, '__name__', type(holder).__name__)))
+    return plan
+
+
+def set_plan(expression_fn, label, operands=(), rewrites=()):
+    setattr(expression_fn, 'hq_plan', PlanNode(label, operands, rewrites))
+    return expression_fn
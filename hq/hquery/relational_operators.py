@@ -40,13 +40,14 @@ def _cmp_node_sets(base_op, first, second):
     first_values = set([number(node) for node in first])
     second_values = set([number(node) for node in second])
 
-    verbose_print('Comparing two nodes sets (size {0} and {1}).'.format(len(first_values), len(second_values)))
+    verbose_print(lambda: 'Comparing two nodes sets (size {0} and {1}).'.format(len(first_values),
+                                                                                len(second_values)))
 
     for first_value in first_values:
         for second_value in second_values:
             if base_op(first_value, second_value):
                 msg = 'Comparison succeeded for "{0}" from first node set and "{1}" in second node set'
-                verbose_print(msg.format(first_value, second_value))
+                verbose_print(lambda: msg.format(first_value, second_value))
                 return True
 
     verbose_print('Comparison failed for all nodes in both node sets.')
@@ -56,11 +57,12 @@ def _cmp_node_sets(base_op, first, second):
 def _cmp_nodes_to_value(base_op, first, second):
     node_values = set([number(node) for node in first])
     second = number(second)
-    verbose_print('Comparing {0} nodes in node set to value {1}'.format(len(node_values), second))
+    verbose_print(lambda: 'Comparing {0} nodes in node set to value {1}'.format(len(node_values), second))
 
     for node_value in node_values:
         if base_op(node_value, second):
-            verbose_print('Comparison succeeded for node value "{0}" and value "{1}"'.format(node_value, second))
+            verbose_print(lambda: 'Comparison succeeded for node value "{0}" and value "{1}"'.format(node_value,
+                                                                                                     second))
             return True
 
     verbose_print('Comparison failed for all nodes in the node set.')
@@ -70,11 +72,12 @@ def _cmp_nodes_to_value(base_op, first, second):
 def _cmp_value_to_nodes(base_op, first, second):
     node_values = set([number(node) for node in second])
     first = number(first)
-    verbose_print('Comparing {0} nodes in node set to value "{1}"'.format(len(node_values), first))
+    verbose_print(lambda: 'Comparing {0} nodes in node set to value "{1}"'.format(len(node_values), first))
 
     for node_value in node_values:
         if base_op(first, node_value):
-            verbose_print('Comparison succeeded for value "{0}" and node value "{1}'.format(first, node_value))
+            verbose_print(lambda: 'Comparison succeeded for value "{0}" and node value "{1}"'.format(first,
+                                                                                                     node_value))
             return True
 
     verbose_print('Comparison failed for all nodes in the node set.')
@@ -1,3 +1,4 @@
+from heapq import merge
 from itertools import filterfalse
 
 from hq.hquery.evaluation_error import HqueryEvaluationError
@@ -5,7 +6,15 @@ from hq.hquery.object_type import object_type_name
 from hq.soup_util import is_any_node
 
 
+class NodeSet(list):
+    """A list of nodes already free of duplicates and in document order; don't mutate one in place."""
+    __slots__ = ()
+
+
 def make_node_set(node_set, reverse=False):
+    if node_set.__class__ is NodeSet:
+        return list(reversed(node_set)) if reverse else node_set
+
     ids = set()
 
     def is_unique_id(node):
@@ -19,14 +28,43 @@ def make_node_set(node_set, reverse=False):
     if not isinstance(node_set, list):
         node_set = [node_set]
 
-    non_node_member = next(filterfalse(is_any_node, node_set), False)
-    if non_node_member:
-        format_str = 'Constructed node set that includes {0} object "{1}"'
-        raise HqueryEvaluationError(format_str.format(object_type_name(non_node_member), non_node_member))
+    _check_all_nodes(node_set)
+    node_set = sorted(filter(is_unique_id, node_set), key=_document_order, reverse=reverse)
 
-    node_set = list(sorted(filter(is_unique_id, node_set), key=lambda n: n.hq_doc_index, reverse=reverse))
+    return node_set if reverse else NodeSet(node_set)
 
-    return node_set
+
+def make_node_set_in_axis_order(nodes, reverse=False):
+    # An axis gathers nodes in proximity order, which is already document order for the forward axes.
+    return nodes if reverse else NodeSet(nodes)
+
+
+def merge_node_sets(node_sets):
+    node_sets = [node_set for node_set in node_sets if len(node_set) > 0]
+
+    if len(node_sets) == 0:
+        return NodeSet()
+    elif len(node_sets) == 1:
+        return make_node_set(node_sets[0])
+    elif not all(node_set.__class__ is NodeSet or len(node_set) == 1 for node_set in node_sets):
+        return make_node_set([node for node_set in node_sets for node in node_set])
+
+    for node_set in node_sets:
+        if node_set.__class__ is not NodeSet:
+            _check_all_nodes(node_set)
+
+    if all(_document_order(before[-1]) < _document_order(after[0])
+           for before, after in zip(node_sets, node_sets[1:])):
+        return NodeSet(node for node_set in node_sets for node in node_set)
+
+    ids = set()
+    result = NodeSet()
+    for node in merge(*node_sets, key=_document_order):
+        node_id = id(node)
+        if node_id not in ids:
+            ids.add(node_id)
+            result.append(node)
+    return result
 
 
 def make_sequence(sequence):
@@ -35,7 +73,30 @@ def make_sequence(sequence):
     return sequence
 
 
-def sequence_concat(first, second):
-    first = make_sequence(first)
-    first.extend(make_sequence(second))
-    return first
+def extend_sequence(buffer, value):
+    # Never modify value itself; it may be a variable's value or a NodeSet shared with other expressions.
+    if isinstance(value, list):
+        buffer.extend(value)
+    else:
+        buffer.append(value)
+    return buffer
+
+
+def iterate_sequence(expression_fn):
+    """Iterate over an expression's items, streaming them from its iterate_items where it has one."""
+    iterate_items = getattr(getattr(expression_fn, '__self__', expression_fn), 'iterate_items', None)
+    if iterate_items is not None:
+        return iterate_items()
+    else:
+        return iter(make_sequence(expression_fn()))
+
+
+def _check_all_nodes(node_set):
+    non_node_member = next(filterfalse(is_any_node, node_set), False)
+    if non_node_member:
+        format_str = 'Constructed node set that includes {0} object "{1}"'
+        raise HqueryEvaluationError(format_str.format(object_type_name(non_node_member), non_node_member))
+
+
+def _document_order(node):
+    return node.hq_doc_index
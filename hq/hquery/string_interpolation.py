@@ -1,11 +1,13 @@
 import re
 
+from hq.hquery.expression_traits import set_traits, any_uses_position, any_uses_context, variables_of
 from hq.hquery.functions.extend_string import _xpath_flags_to_re_flags, string_join
-from hq.hquery.object_type import string_value, is_sequence
+from hq.hquery.object_type import string_value, is_sequence, STRING
+from hq.hquery.query_plan import set_plan
 from hq.hquery.syntax_error import HquerySyntaxError
 from hq.soup_util import debug_dump_long_string
 from hq.string_util import truncate_string, html_entity_decode
-from hq.verbosity import verbose_print
+from hq.verbosity import traced, verbose_print
 
 
 clauses_pattern = re.compile(r'(\$\{[^\}]+\})|(\$[a-zA-Z_]\w*)|((?:[^\$]+))')
@@ -90,7 +92,10 @@ def reduce_filters_and_expression(remainder, parse_interface, chain=None):
     if chain is None:
         return eval_fn
     else:
-        return chain(eval_fn)
+        return set_traits(set_plan(chain(eval_fn), 'interpolated string filters', [eval_fn]),
+                          uses_position=any_uses_position(eval_fn),
+                          uses_context=any_uses_context(eval_fn),
+                          variables=variables_of(eval_fn))
 
 
 def parse_interpolated_string(source, parse_interface):
@@ -109,20 +114,27 @@ def parse_interpolated_string(source, parse_interface):
             expressions.append(_make_literal_identity_closure(literal))
 
     def evaluate():
-        chunks = [string_value(exp()) for exp in expressions]
-        verbose_print(u'Interpolated string evaluation assembling {0} chunks{1}.'.format(
-            len(chunks),
-            '' if len(chunks) == 0 else u' ("{0}")'.format(u'", "'.join(chunks)))
-        )
-        return ''.join(chunks)
+        return ''.join(string_value(exp()) for exp in expressions)
 
     verbose_print(
         u'Finished parsing interpolated string `{0}` ({1} chunk(s) found)'.format(debug_dump_long_string(source),
                                                                                   len(expressions)),
         outdent_before=True
     )
-    return evaluate
+    evaluate = traced(evaluate,
+                      lambda: u'Evaluating interpolated string `{0}`'.format(debug_dump_long_string(source)),
+                      lambda result: u'Interpolated string evaluated to "{0}"'.format(debug_dump_long_string(result)))
+    set_plan(evaluate, u'interpolated string `{0}`'.format(debug_dump_long_string(source)), expressions)
+    return set_traits(evaluate,
+                      STRING,
+                      uses_position=any_uses_position(*expressions),
+                      uses_context=any_uses_context(*expressions),
+                      variables=variables_of(*expressions))
 
 
 def _make_literal_identity_closure(value):
-    return lambda: html_entity_decode(value)
+    return set_traits(set_plan(lambda: html_entity_decode(value), u'literal text `{0}`'.format(value)),
+                      STRING,
+                      uses_position=False,
+                      uses_context=False,
+                      variables=frozenset())
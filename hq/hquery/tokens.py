@@ -1,20 +1,25 @@
 from hq.hquery.computed_constructors.hash_key_value import ComputedHashKeyValueConstructor
 from hq.hquery.equality_operators import equals, not_equals
+from hq.hquery.expression_traits import set_traits, any_uses_position, any_uses_context, function_result_types, \
+    positional_functions, context_node_functions, variables_of, LAST_POSITION
 from hq.hquery.flwor import Flwor
 from hq.hquery.function_support import FunctionSupport
 from hq.hquery.functions.core_boolean import boolean
 from hq.hquery.functions.core_number import number
+from hq.hquery.location_path import as_existence_test, EXISTENCE_TEST_REWRITE
 from hq.hquery.node_test import NodeTest
-from hq.hquery.object_type import object_type_name, debug_dump_anything
-from hq.hquery.sequences import make_node_set, sequence_concat
+from hq.hquery.object_type import debug_dump_anything, BOOLEAN, NUMBER, SEQUENCE, STRING
+from hq.hquery.sequences import make_node_set, merge_node_sets, extend_sequence, iterate_sequence
+from hq.hquery.query_plan import set_plan
 from hq.hquery.relational_operators import RelationalOperator
 from hq.hquery.string_interpolation import parse_interpolated_string
 from hq.hquery.syntax_error import HquerySyntaxError
 from hq.hquery.union_decomposition import UnionDecomposition
 from hq.hquery.variables import value_of_variable
-from hq.soup_util import soup_from_any_tag
+from hq.profiling import profiled
+from hq.soup_util import debug_dump_long_string, soup_from_any_tag
 from hq.string_util import html_entity_decode
-from hq.verbosity import verbose_print
+from hq.verbosity import traced
 
 from .axis import Axis
 from .expression_context import get_context_node
@@ -23,6 +28,31 @@ function_support = FunctionSupport()
 
 
 
+_functions_of_effective_boolean_value = {'boolean', 'not'}
+
+
+
+def _debug_dump_result(value):
+    # Expressions can produce values debug_dump_anything doesn't know, like hash keys and Python booleans.
+    try:
+        return debug_dump_anything(value)
+    except RuntimeError:
+        return debug_dump_long_string(str(value))
+
+
+
+def _existence_test_rewrites(operands, tested):
+    return ['operand {0}: {1}'.format(index + 1, EXISTENCE_TEST_REWRITE)
+            for index, (operand, test) in enumerate(zip(operands, tested)) if test is not operand]
+
+
+def _flattening_rewrites(operands):
+    if len(operands) > 2:
+        return ['nested sequences flattened, so all {0} operands are gathered into one list'.format(len(operands))]
+    return []
+
+
+
 class LBP:
     """Left-binding precendence values."""
     (
@@ -48,30 +78,28 @@ class Token(object):
                                   constructor=lambda v: v,
                                   type_name='xpath object'):
         try:
-            self._gab('operator evaluation...', indent_after=True)
-            self._gab('evaluating left-hand side.', indent_after=True)
-            left_value = constructor(left_generator())
-            self._gab('evaluating right-hand side.', outdent_before=True, indent_after=True)
-            right_value = constructor(right_generator())
-            self._gab('operand evaluation complete', outdent_before=True)
-            self._gab('evaluating expression {0} {1} {2}'.format(left_value, self, right_value), outdent_before=True)
-            return left_value, right_value
+            return constructor(left_generator()), constructor(right_generator())
         except TypeError:
             raise HquerySyntaxError('evaluated against a non-{0} operand'.format(type_name))
 
 
     def _evaluate_unary_operand(self, operand_generator, constructor=lambda v: v, type_name='xpath object'):
         try:
-            self._gab('evaluating operand.', indent_after=True)
-            operand_value = constructor(operand_generator())
-            self._gab('operand evaluation complete', outdent_before=True)
-            return operand_value
+            return constructor(operand_generator())
         except TypeError:
             raise HquerySyntaxError('evaluated against a non-{0} operand'.format(type_name))
 
 
-    def _gab(self, msg, **kwargs):
-        verbose_print(u'{0} {1}'.format(self, msg), **kwargs)
+    def _compiled(self, evaluate, *operands, rewrites=()):
+        """Return the evaluate closure this token compiled to, wrapped to report each evaluation and its result when
+        verbose output is on, or as it is when it's off, and carrying its plan: the token, the rewrites applied to it
+        and the operand expressions it evaluates."""
+        return set_plan(traced(evaluate,
+                               lambda: u'{0} evaluating'.format(self),
+                               lambda result: u'{0} returning {1}'.format(self, _debug_dump_result(result))),
+                        str(self),
+                        operands,
+                        rewrites)
 
 
 
@@ -101,11 +129,13 @@ class AddOrSubtractOperatorToken(Token):
 
         def evaluate():
             left_value, right_value = self._evaluate_binary_operands(left, right, constructor=number, type_name='number')
-            result = left_value + right_value if self.value == '+' else left_value - right_value
-            self._gab('returning {0}'.format(result))
-            return result
+            return left_value + right_value if self.value == '+' else left_value - right_value
 
-        return evaluate
+        return set_traits(self._compiled(evaluate, left, right),
+                          NUMBER,
+                          uses_position=any_uses_position(left, right),
+                          uses_context=any_uses_context(left, right),
+                          variables=variables_of(left, right))
 
     def nud(self):
         if self.value != '-':
@@ -115,11 +145,13 @@ class AddOrSubtractOperatorToken(Token):
 
         def evaluate():
             right_value = self._evaluate_unary_operand(right, constructor=number, type_name='number')
-            result = -right_value
-            self._gab('returning {0}'.format(result))
-            return result
+            return -right_value
 
-        return evaluate
+        return set_traits(self._compiled(evaluate, right),
+                          NUMBER,
+                          uses_position=any_uses_position(right),
+                          uses_context=any_uses_context(right),
+                          variables=variables_of(right))
 
 
 
@@ -131,17 +163,22 @@ class AndOperator(Token):
 
     def led(self, left):
         right = self.parse_interface.expression(self.lbp)
+        tested = as_existence_test(left), as_existence_test(right)
+        rewrites = _existence_test_rewrites((left, right), tested)
+        left, right = tested
 
         def evaluate():
             left_value, right_value = self._evaluate_binary_operands(left,
                                                                      right,
                                                                      constructor=boolean,
                                                                      type_name='boolean')
-            result = bool(left_value) and bool(right_value)
-            self._gab('returning {0}'.format(result))
-            return result
+            return bool(left_value) and bool(right_value)
 
-        return evaluate
+        return set_traits(self._compiled(evaluate, left, right, rewrites=rewrites),
+                          BOOLEAN,
+                          uses_position=any_uses_position(left, right),
+                          uses_context=any_uses_context(left, right),
+                          variables=variables_of(left, right))
 
 
 
@@ -201,11 +238,28 @@ class CommaToken(Token):
     def led(self, left):
         right = self.parse_interface.expression(self.lbp)
 
+        # "a, b, c" parses as "(a, b), c"; gather all the operands so that the whole sequence is built in one list.
+        operands = getattr(left, 'sequence_operands', (left,)) + (right,)
+
         def evaluate():
-            left_value, right_value = self._evaluate_binary_operands(left, right)
-            return sequence_concat(left_value, right_value)
+            result = []
+            for operand in operands:
+                extend_sequence(result, operand())
+            return result
+
+        def iterate_items():
+            for operand in operands:
+                for item in iterate_sequence(operand):
+                    yield item
 
-        return evaluate
+        setattr(evaluate, 'sequence_operands', operands)
+        setattr(evaluate, 'iterate_items', iterate_items)
+
+        return set_traits(self._compiled(evaluate, *operands, rewrites=_flattening_rewrites(operands)),
+                          SEQUENCE,
+                          uses_position=any_uses_position(*operands),
+                          uses_context=any_uses_context(*operands),
+                          variables=variables_of(*operands))
 
 
 
@@ -252,11 +306,13 @@ class DivOrModOperatorToken(Token):
 
         def evaluate():
             left_value, right_value = self._evaluate_binary_operands(left, right, constructor=number, type_name='number')
-            result = left_value / right_value if self.value == 'div' else left_value % right_value
-            self._gab('{0} returning {1}'.format(self, result))
-            return result
+            return left_value / right_value if self.value == 'div' else left_value % right_value
 
-        return evaluate
+        return set_traits(self._compiled(evaluate, left, right),
+                          NUMBER,
+                          uses_position=any_uses_position(left, right),
+                          uses_context=any_uses_context(left, right),
+                          variables=variables_of(left, right))
 
 
 
@@ -291,11 +347,15 @@ class EqualityOperatorToken(Token):
 
         def evaluate():
             left_value, right_value = self._evaluate_binary_operands(left, right)
-            result = equals(left_value, right_value) if self.value == '=' else not_equals(left_value, right_value)
-            self._gab('returning {0}'.format(result))
-            return result
+            return equals(left_value, right_value) if self.value == '=' else not_equals(left_value, right_value)
 
-        return evaluate
+        setattr(evaluate, 'equality_operands', (self.value, left, right))
+
+        return set_traits(self._compiled(evaluate, left, right),
+                          BOOLEAN,
+                          uses_position=any_uses_position(left, right),
+                          uses_context=any_uses_context(left, right),
+                          variables=variables_of(left, right))
 
 
 
@@ -328,14 +388,25 @@ class FunctionCallToken(Token):
 
         self.parse_interface.advance(CloseParenthesisToken)
 
+        rewrites = ()
+        if self.value in _functions_of_effective_boolean_value and len(arg_generators) == 1:
+            tested = [as_existence_test(arg_generators[0])]
+            rewrites = _existence_test_rewrites(arg_generators, tested)
+            arg_generators = tested
+
         def evaluate():
-            self._gab('evaluating argument list for function "{0}."'.format(self.value))
-            arguments = [gen() for gen in arg_generators]
-            arg_types = ','.join(object_type_name(arg) for arg in arguments)
-            self._gab('calling {0}({1}).'.format(self.value, arg_types))
-            return function_support.call_function(self.value, *arguments)
+            return function_support.call_function(self.value, *[gen() for gen in arg_generators])
 
-        return evaluate
+        evaluate = profiled(evaluate,
+                            'function',
+                            lambda: '{0}({1})'.format(self.value, ', '.join(['<expr>'] * len(arg_generators))))
+
+        return set_traits(self._compiled(evaluate, *arg_generators, rewrites=rewrites),
+                          function_result_types.get(self.value),
+                          uses_position=(self.value in positional_functions or any_uses_position(*arg_generators)),
+                          uses_context=(self.value in context_node_functions or any_uses_context(*arg_generators)),
+                          variables=variables_of(*arg_generators),
+                          position_selector=(LAST_POSITION if self.value == 'last' and not arg_generators else None))
 
 
 
@@ -384,7 +455,13 @@ class LiteralNumberToken(Token):
         return '(literal-number {0})'.format(self.value)
 
     def nud(self):
-        return lambda: number(self.value)
+        value = number(self.value)
+        return set_traits(set_plan(lambda: value, str(self)),
+                          NUMBER,
+                          uses_position=False,
+                          uses_context=False,
+                          variables=frozenset(),
+                          position_selector=value)
 
 
 
@@ -398,7 +475,11 @@ class LiteralStringToken(Token):
         return u'(literal-string "{0}")'.format(self.value)
 
     def nud(self):
-        return lambda: self.value
+        return set_traits(set_plan(lambda: self.value, str(self)),
+                          STRING,
+                          uses_position=False,
+                          uses_context=False,
+                          variables=frozenset())
 
 
 
@@ -413,11 +494,13 @@ class MultiplyOperatorToken(Token):
 
         def evaluate():
             left_value, right_value = self._evaluate_binary_operands(left, right, constructor=number, type_name='number')
-            result = left_value * right_value
-            self._gab('{0} returning {1}'.format(self, result))
-            return result
+            return left_value * right_value
 
-        return evaluate
+        return set_traits(self._compiled(evaluate, left, right),
+                          NUMBER,
+                          uses_position=any_uses_position(left, right),
+                          uses_context=any_uses_context(left, right),
+                          variables=variables_of(left, right))
 
 
 
@@ -495,17 +578,22 @@ class OrOperatorToken(Token):
 
     def led(self, left):
         right = self.parse_interface.expression(self.lbp)
+        tested = as_existence_test(left), as_existence_test(right)
+        rewrites = _existence_test_rewrites((left, right), tested)
+        left, right = tested
 
         def evaluate():
             left_value, right_value = self._evaluate_binary_operands(left,
                                                                      right,
                                                                      constructor=boolean,
                                                                      type_name='boolean')
-            result = bool(left_value) or bool(right_value)
-            self._gab('returning {0}'.format(result))
-            return result
+            return bool(left_value) or bool(right_value)
 
-        return evaluate
+        return set_traits(self._compiled(evaluate, left, right, rewrites=rewrites),
+                          BOOLEAN,
+                          uses_position=any_uses_position(left, right),
+                          uses_context=any_uses_context(left, right),
+                          variables=variables_of(left, right))
 
 
 
@@ -536,7 +624,11 @@ class RangeOperatorToken(Token):
                                                                      type_name='number')
             return list(number(x) for x in range(int(left_value), int(right_value + 1)))
 
-        return evaluate
+        return set_traits(self._compiled(evaluate, left, right),
+                          SEQUENCE,
+                          uses_position=any_uses_position(left, right),
+                          uses_context=any_uses_context(left, right),
+                          variables=variables_of(left, right))
 
 
 
@@ -551,11 +643,13 @@ class RelationalOperatorToken(Token):
 
         def evaluate():
             left_value, right_value = self._evaluate_binary_operands(left, right)
-            result = RelationalOperator(self.value).evaluate(left_value, right_value)
-            self._gab('returning {0}'.format(result))
-            return result
+            return RelationalOperator(self.value).evaluate(left_value, right_value)
 
-        return evaluate
+        return set_traits(self._compiled(evaluate, left, right),
+                          BOOLEAN,
+                          uses_position=any_uses_position(left, right),
+                          uses_context=any_uses_context(left, right),
+                          variables=variables_of(left, right))
 
 
 
@@ -577,7 +671,11 @@ class SlashToken(Token):
             path = self.parse_interface.location_path(self)
             return path.evaluate
         else:
-            return lambda: make_node_set(soup_from_any_tag(get_context_node()))
+            return set_traits(set_plan(lambda: make_node_set(soup_from_any_tag(get_context_node())), 'root node'),
+                              SEQUENCE,
+                              uses_position=False,
+                              uses_context=False,
+                              variables=frozenset())
 
 
 
@@ -625,6 +723,7 @@ class UnionOperatorToken(Token):
 
         def evaluate():
             left_value, right_value = self._evaluate_binary_operands(left, right, type_name='node set')
+            result = merge_node_sets([left_value, right_value])
             for item in right_value:
                 if not isinstance(getattr(item, 'union_index', None), int):
                     setattr(item, 'union_index', right_union_index)
@@ -632,14 +731,15 @@ class UnionOperatorToken(Token):
                 for item in left_value:
                     if not isinstance(getattr(item, 'union_index', None), int):
                         setattr(item, 'union_index', left_union_index)
-            left_value.extend(right_value)
-            result = make_node_set(left_value)
-            self._gab('returning node set with {0} nodes'.format(len(result)))
             return result
 
         setattr(evaluate, 'union_index', right_union_index)
 
-        return evaluate
+        return set_traits(self._compiled(evaluate, left, right),
+                          SEQUENCE,
+                          uses_position=any_uses_position(left, right),
+                          uses_context=any_uses_context(left, right),
+                          variables=variables_of(left, right))
 
 
 
@@ -652,8 +752,9 @@ class VariableToken(Token):
     def nud(self):
 
         def evaluate():
-            result = value_of_variable(self.value)
-            self._gab(lambda: u'reference evaluating to value {0}'.format(debug_dump_anything(result)))
-            return result
+            return value_of_variable(self.value)
 
-        return evaluate
+        return set_traits(self._compiled(evaluate),
+                          uses_position=False,
+                          uses_context=False,
+                          variables=frozenset([self.value]))
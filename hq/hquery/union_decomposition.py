@@ -1,8 +1,8 @@
 from hq.hquery.evaluation_error import HqueryEvaluationError
-from hq.hquery.object_type import debug_dump_anything
-from hq.hquery.sequences import make_sequence, sequence_concat
+from hq.hquery.query_plan import PlanNode
+from hq.hquery.sequences import make_sequence, extend_sequence
 from hq.hquery.variables import push_variable, variable_scope
-from hq.verbosity import verbose_print
+from hq.verbosity import traced
 
 
 class UnionDecomposition:
@@ -11,22 +11,33 @@ class UnionDecomposition:
         self.mapping_generators = None
         self.union_expression = None
 
+        self._decompose = traced(self._decompose,
+                                 lambda: 'Evaluating union decomposition ({0} clauses)'.format(
+                                     len(self.mapping_generators)),
+                                 lambda result: 'Union decomposition completed; returning {0} items'.format(
+                                     len(result)))
+
 
     def __str__(self):
         union_str = ' | '.join('<expr>' * len(self.mapping_generators))
         return '{0} => {0}'.format(union_str)
 
 
+    @property
+    def hq_plan(self):
+        clauses = [PlanNode('clause {0}'.format(index + 1), [fn]) for index, fn in enumerate(self.mapping_generators)]
+        return PlanNode('union decomposition', [PlanNode('union', [self.union_expression])] + clauses)
+
+
     def evaluate(self):
-        verbose_print('Evaluating union decomposition ({} clauses)'.format(len(self.mapping_generators)),
-                      indent_after=True)
+        return self._decompose()
 
+
+    def _decompose(self):
         sequence = make_sequence(self.union_expression())
         result = []
 
         for item in sequence:
-            verbose_print(lambda: u'Visiting item {0}'.format(debug_dump_anything(item)), indent_after=True)
-
             with variable_scope():
                 push_variable('_', make_sequence(item))
                 if not hasattr(item, 'union_index'):
@@ -35,15 +46,8 @@ class UnionDecomposition:
                     )
                 if item.union_index >= len(self.mapping_generators):
                     raise HqueryEvaluationError("Decomposed union had more clauses than its mapping")
-                this_result = make_sequence(self.mapping_generators[item.union_index]())
-                verbose_print(
-                    'Mapping yielded {0} results for this visit'.format(
-                        len(this_result)))
-                result = sequence_concat(result, this_result)
-
-            verbose_print('Visit finished', outdent_before=True)
+                extend_sequence(result, self.mapping_generators[item.union_index]())
 
-        verbose_print('Union decomposition completed', outdent_before=True)
         return result
 
 
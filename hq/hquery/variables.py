@@ -1,4 +1,5 @@
 from hq.hquery.object_type import debug_dump_anything
+from hq.config import settings
 from hq.verbosity import verbose_print
 
 variable_stack = []
@@ -15,7 +16,8 @@ class variable_scope:
 
 def push_variable(name, value):
     global variable_stack
-    verbose_print(lambda: u'Pushing variable onto stack: let ${0} := {1}'.format(name, debug_dump_anything(value)))
+    if settings.VERBOSE:
+        verbose_print(u'Pushing variable onto stack: let ${0} := {1}'.format(name, debug_dump_anything(value)))
     variable_stack.append((name, value))
 
 
@@ -23,9 +25,10 @@ def value_of_variable(name):
     if len(variable_stack) > 0:
         for index in range(len(variable_stack) - 1, -1, -1):
             if variable_stack[index][NAME] == name:
-                reverse_index = len(variable_stack) - (index + 1)
-                verbose_print('Variable "${0}" found on stack (position {1}).'.format(name, reverse_index))
+                if settings.VERBOSE:
+                    reverse_index = len(variable_stack) - (index + 1)
+                    verbose_print('Variable "${0}" found on stack (position {1}).'.format(name, reverse_index))
                 return variable_stack[index][VALUE]
 
-    verbose_print('Variable "${0}" NOT FOUND on variable stack.'.format(name))
+    verbose_print(lambda: 'Variable "${0}" NOT FOUND on variable stack.'.format(name))
     return None
@@ -1,10 +1,19 @@
+import codecs
 from builtins import str
 
+from bs4.element import AttributeValueWithCharsetSubstitution, NavigableString, Tag
+
 from .hquery.object_type import is_sequence
 from .soup_util import is_text_node, is_attribute_node, is_comment_node, is_tag_node, derive_text_from_node, \
     is_root_node
 
 
+def convert_results_to_output_items(results, pretty=True, preserve_space=False):
+    if not is_sequence(results):
+        results = [results]
+    return [value_object_to_text(object, pretty, preserve_space) for object in results]
+
+
 def convert_results_to_output_text(results, pretty=True, preserve_space=False):
     if is_sequence(results):
         return '\n'.join(value_object_to_text(object, pretty, preserve_space) for object in results)
@@ -12,14 +21,174 @@ def convert_results_to_output_text(results, pretty=True, preserve_space=False):
         return value_object_to_text(results, pretty, preserve_space)
 
 
+DEFAULT_OUTPUT_BUFFER_SIZE = 64 * 1024
+
+
+class ResultWriter:
+    """Encodes results into a buffer that goes to a binary stream once it holds buffer_size bytes."""
+
+    def __init__(self, stream, pretty=True, preserve_space=False, encoding='utf-8',
+                 buffer_size=DEFAULT_OUTPUT_BUFFER_SIZE):
+        self.stream = stream
+        self.pretty = pretty
+        self.preserve_space = preserve_space
+        self.encoding = codecs.lookup(encoding).name
+        self.buffer_size = buffer_size
+        self.count = 0
+        self.buffered_chunks = []
+        self.buffered_length = 0
+
+    def write(self, obj):
+        text = value_object_to_text(obj, self.pretty, self.preserve_space)
+        self._write_text(text if self.count == 0 else u'\n' + text)
+        self.count += 1
+
+    def write_all(self, objects):
+        for obj in objects:
+            self.write(obj)
+
+    def finish(self):
+        self._write_text(u'\n')
+        self.flush()
+
+    def flush(self):
+        if self.buffered_length > 0:
+            self.stream.write(b''.join(self.buffered_chunks))
+            self.buffered_chunks = []
+            self.buffered_length = 0
+        self.stream.flush()
+
+    def _write_text(self, text):
+        chunk = text.encode(self.encoding)
+        self.buffered_chunks.append(chunk)
+        self.buffered_length += len(chunk)
+        if self.buffered_length >= self.buffer_size:
+            self.flush()
+
+
 def value_object_to_text(obj, pretty, preserve_space):
     if is_comment_node(obj):
         return u'<!-- {0} -->'.format(str(obj).strip())
     elif is_tag_node(obj) or is_root_node(obj):
-        return obj.prettify().rstrip(' \t\n') if pretty else str(obj)
+        return markup_to_text(obj, pretty)
     elif is_attribute_node(obj):
         return u'{0}="{1}"'.format(obj.name, derive_text_from_node(obj, preserve_space=preserve_space))
     elif is_text_node(obj):
         return derive_text_from_node(obj, preserve_space=preserve_space)
     else:
         return str(obj)
+
+
+# The serializer below reproduces the layout of Tag.decode() in Beautiful Soup 4.13 and later.
+_OUTPUT_ENCODING = 'utf-8'
+_end_of_children = object()
+
+
+def markup_to_text(node, pretty):
+    pieces = []
+    serialize_markup(node, pieces, pretty)
+    text = u''.join(pieces)
+    return text.rstrip(' \t\n') if pretty else text
+
+
+def serialize_markup(node, pieces, pretty):
+    """Append markup reading the same as node.prettify() (or str(node), if not pretty) to a list of pieces."""
+    if is_root_node(node) and node.is_xml:
+        # XML documents get a declaration prepended, so let Beautiful Soup lay those out.
+        pieces.append(node.prettify() if pretty else str(node))
+        return
+
+    formatter = node.formatter_for_name('minimal')
+    substitute = formatter.entity_substitution
+    cdata_containing_tags = formatter.cdata_containing_tags
+    indent = formatter.indent
+    append = pieces.append
+
+    level = 0
+    literal_tag = None
+    stack = [(None, iter(node.contents if node.hidden else (node,)))]
+
+    while stack:
+        parent, children = stack[-1]
+        child = next(children, _end_of_children)
+
+        if child is _end_of_children:
+            stack.pop()
+            if parent is None:
+                continue
+            piece = u'' if parent.hidden else u'</' + _tag_prefix(parent) + parent.name + u'>'
+            if pretty:
+                level -= 1
+                if parent is literal_tag:
+                    literal_tag = None
+                    if piece:
+                        piece += u'\n'
+                elif literal_tag is None and piece:
+                    piece = indent * level + piece + u'\n'
+            append(piece)
+
+        elif isinstance(child, Tag):
+            if len(child.contents) == 0 and child.can_be_empty_element:
+                piece = _opening_tag(child, formatter, substitute, formatter.void_element_close_prefix or u'')
+                if pretty and literal_tag is None and piece:
+                    piece = indent * level + piece + u'\n'
+                append(piece)
+            else:
+                piece = _opening_tag(child, formatter, substitute, u'')
+                if pretty:
+                    if literal_tag is None:
+                        if child.preserve_whitespace_tags and child.name in child.preserve_whitespace_tags:
+                            literal_tag = child
+                            piece = indent * level + piece if piece else piece
+                        elif piece:
+                            piece = indent * level + piece + u'\n'
+                    level += 1
+                append(piece)
+                stack.append((child, iter(child.contents)))
+
+        else:
+            if child.__class__ is NavigableString:
+                if substitute is None or (child.parent is not None and child.parent.name in cdata_containing_tags):
+                    piece = str(child)
+                else:
+                    piece = substitute(child)
+            else:
+                piece = child.output_ready(formatter)
+            if pretty and literal_tag is None:
+                piece = piece.strip()
+                if piece:
+                    piece = indent * level + piece + u'\n'
+            append(piece)
+
+
+def _opening_tag(tag, formatter, substitute, void_element_close_prefix):
+    if tag.hidden:
+        return u''
+
+    attributes = []
+    if tag.attrs:
+        for key, value in formatter.attributes(tag):
+            if value is None:
+                attributes.append(key)
+                continue
+            if isinstance(value, (list, tuple)):
+                value = u' '.join(value)
+            elif not isinstance(value, str):
+                value = str(value)
+            elif isinstance(value, AttributeValueWithCharsetSubstitution):
+                value = value.substitute_encoding(_OUTPUT_ENCODING)
+            if substitute is not None:
+                value = substitute(value)
+            if u'"' in value:
+                attributes.append(key + u'=' + formatter.quoted_attribute_value(value))
+            else:
+                attributes.append(key + u'="' + value + u'"')
+
+    if attributes:
+        return u'<' + _tag_prefix(tag) + tag.name + u' ' + u' '.join(attributes) + void_element_close_prefix + u'>'
+    else:
+        return u'<' + _tag_prefix(tag) + tag.name + void_element_close_prefix + u'>'
+
+
+def _tag_prefix(tag):
+    return tag.prefix + u':' if tag.prefix else u''
@@ -0,0 +1,98 @@
+import sys
+from timeit import default_timer
+
+from .config import settings
+
+
+profile_entries = []
+_child_times = []
+
+
+class ProfileEntry:
+    """Counters for one piece of a compiled expression. Cumulative time includes the time spent in other profiled
+    pieces it called; self time doesn't."""
+
+    def __init__(self, kind, describe, counts_nodes_in):
+        self.kind = kind
+        self.describe = describe
+        self.counts_nodes_in = counts_nodes_in
+        self.reset()
+
+    def reset(self):
+        self.calls = self.nodes_in = self.nodes_out = 0
+        self.cumulative_time = self.self_time = 0.0
+
+
+def set_profiling(profile):
+    setattr(settings, 'PROFILE', profile)
+
+
+def count_items(value):
+    return len(value) if isinstance(value, list) else 1
+
+
+def profiled(fn, kind, describe, count_in=None, count_out=count_items):
+    """Like verbosity.traced, but wrap fn to add its calls, nodes in and out and time spent to a profile entry."""
+    if not settings.PROFILE:
+        return fn
+
+    entry = ProfileEntry(kind, describe, counts_nodes_in=(count_in is not None))
+    profile_entries.append(entry)
+
+    def profiled_fn(*args):
+        entry.calls += 1
+        if count_in is not None:
+            entry.nodes_in += count_in(*args)
+
+        _child_times.append(0.0)
+        start = default_timer()
+        try:
+            result = fn(*args)
+        finally:
+            elapsed = default_timer() - start
+            entry.cumulative_time += elapsed
+            entry.self_time += elapsed - _child_times.pop()
+            if len(_child_times) > 0:
+                _child_times[-1] += elapsed
+
+        entry.nodes_out += count_out(result)
+        return result
+
+    iterate_items = getattr(getattr(fn, '__self__', fn), 'iterate_items', None)
+    if iterate_items is not None:
+        # Keep streamable expressions streaming; time spent between items isn't counted.
+        def profiled_iterate_items():
+            entry.calls += 1
+            for item in iterate_items():
+                entry.nodes_out += 1
+                yield item
+
+        profiled_fn.iterate_items = profiled_iterate_items
+
+    return profiled_fn
+
+
+def reset_profile():
+    for entry in profile_entries:
+        entry.reset()
+
+
+def print_profile_report(file=None):
+    """Print every profiled piece that ran, ranked by self time, to file (stderr by default)."""
+    file = sys.stderr if file is None else file
+    entries = sorted((entry for entry in profile_entries if entry.calls > 0),
+                     key=lambda entry: entry.self_time,
+                     reverse=True)
+
+    print(u'PROFILE (ranked by self time; times in milliseconds)', file=file)
+    print(u'{0:>10} {1:>10} {2:>9} {3:>10} {4:>10}  {5:<9} {6}'.format(
+        'self', 'cumulative', 'calls', 'nodes in', 'nodes out', 'kind', 'expression'), file=file)
+    for entry in entries:
+        print(u'{0:>10.3f} {1:>10.3f} {2:>9} {3:>10} {4:>10}  {5:<9} {6}'.format(
+            entry.self_time * 1000,
+            entry.cumulative_time * 1000,
+            entry.calls,
+            entry.nodes_in if entry.counts_nodes_in else '',
+            entry.nodes_out,
+            entry.kind,
+            entry.describe()), file=file)
@@ -1,12 +1,21 @@
 import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
 from builtins import str
 from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
 
 from .string_util import truncate_string
 from .verbosity import verbose_print
 
 
+DEFAULT_PARSER = 'html.parser'
+
+DerivedTextCacheInfo = namedtuple('DerivedTextCacheInfo', ('hits', 'misses'))
+
+
 class AttributeNode:
+    __slots__ = ('name', 'value', 'hq_doc_index', 'union_index')
 
     def __init__(self, name, value):
         self.name = name
@@ -17,11 +26,24 @@ class AttributeNode:
 
     @classmethod
     def enumerate(cls, node):
-        if hasattr(node, 'hq_attrs') and _isnt_root_with_odd_ghost_hq_attrs_on_it_for_reasons_i_dont_understand(node):
-            return node.hq_attrs
-        else:
+        if not is_tag_node(node):
             return []
 
+        attr_nodes = node.__dict__.get('hq_attrs')
+        if attr_nodes is None:
+            if 'hq_doc_index' not in node.__dict__:
+                return []
+            attr_nodes = node.hq_attrs = cls._materialize(node)
+        return attr_nodes
+
+    @classmethod
+    def _materialize(cls, tag):
+        attrs = tag.attrs
+        attr_nodes = [AttributeNode(name, attrs[name]) for name in sorted(attrs, key=_lowercase)]
+        for offset, attr in enumerate(attr_nodes):
+            attr.hq_doc_index = tag.hq_doc_index + 1 + offset
+        return attr_nodes
+
 
 def debug_dump_long_string(s, length=50, one_line=True, suffix='...'):
     return truncate_string(s, length, one_line, suffix)
@@ -44,23 +66,7 @@ def debug_dump_node(obj):
 
 def derive_text_from_node(obj, preserve_space=False):
     if is_tag_node(obj) or is_root_node(obj):
-        result = u''
-        strings = list(obj.strings)
-        cursor = 0
-        for run in (strings if preserve_space else obj.stripped_strings):
-            if preserve_space:
-                add_space = False
-            else:
-                while cursor < len(strings):
-                    if run in strings[cursor]:
-                        break
-                    else:
-                        cursor += 1
-                if cursor < len(strings):
-                    add_space = strings[cursor][0].isspace() or (cursor > 0 and strings[cursor - 1][-1].isspace())
-                else:
-                    add_space = False
-            result += u'{0}{1}'.format(' ' if add_space else '', run)
+        return _cached_text_from_tag(obj, preserve_space)
     elif is_attribute_node(obj):
         result = obj.value
     elif is_text_node(obj):
@@ -69,12 +75,79 @@ def derive_text_from_node(obj, preserve_space=False):
         raise RuntimeError("don't know how to derive test from {0}".format(debug_dump_node(obj)))
 
     if not preserve_space:
-        result = re.sub(u'\u00a0', ' ', result)
-        result = re.sub(r'\s+', ' ', result).strip()
+        result = _normalize_whitespace(result)
 
     return result
 
 
+def css_class_index(soup):
+    index = soup.__dict__.get('hq_css_class_index')
+
+    if index is None:
+        index = dict()
+        for node in soup.descendants:
+            if node.__class__.__name__ == 'Tag' and 'hq_doc_index' in node.__dict__ and 'class' in node.attrs:
+                for name in _css_class_names(node):
+                    entry = index.get(name)
+                    if entry is None:
+                        entry = index[name] = ([], [])
+                    if len(entry[1]) == 0 or entry[1][-1] is not node:
+                        entry[0].append(node.hq_doc_index)
+                        entry[1].append(node)
+        soup.hq_css_class_index = index
+        verbose_print('Built CSS class index covering {0} distinct class names.'.format(len(index)))
+
+    return index
+
+
+def derived_text_cache_info():
+    return DerivedTextCacheInfo(_derived_text_cache_counts[0], _derived_text_cache_counts[1])
+
+
+def descendants_by_css_class(node, name):
+    if not (is_tag_node(node) or is_root_node(node)) or 'hq_doc_index' not in node.__dict__:
+        return None
+    return _descendants_in_index_entry(node, css_class_index(soup_from_any_tag(node)).get(name, _empty_index_entry))
+
+
+def descendants_by_tag_name(node, name):
+    if not (is_tag_node(node) or is_root_node(node)) or 'hq_doc_index' not in node.__dict__:
+        return None
+    return _descendants_in_index_entry(node, tag_name_index(soup_from_any_tag(node)).get(name, _empty_index_entry))
+
+
+def forget_derived_text(node):
+    """Drop the string values cached for node and its ancestors, which are stale once node's contents change."""
+    while node is not None:
+        node.__dict__.pop('hq_text', None)
+        node.__dict__.pop('hq_preserved_text', None)
+        node = node.parent
+
+
+def has_css_class(tag, name):
+    if 'hq_doc_index' not in tag.__dict__:
+        return is_tag_node(tag) and 'class' in tag.attrs and name in _css_class_names(tag)
+
+    doc_indexes, tags = css_class_index(soup_from_any_tag(tag)).get(name, _empty_index_entry)
+    position = bisect_left(doc_indexes, tag.hq_doc_index)
+    return position < len(tags) and tags[position] is tag
+
+
+def id_index(soup):
+    index = soup.__dict__.get('hq_id_index')
+
+    if index is None:
+        index = dict()
+        for node in soup.descendants:
+            if node.__class__.__name__ == 'Tag' and 'id' in node.attrs:
+                index.setdefault(node['id'], []).append(node)
+        if is_root_node(soup):
+            soup.hq_id_index = index
+            verbose_print('Built ID index covering {0} distinct IDs.'.format(len(index)))
+
+    return index
+
+
 def is_any_node(obj):
     return is_root_node(obj) or is_tag_node(obj) or is_attribute_node(obj) or is_text_node(obj) or is_comment_node(obj)
 
@@ -99,33 +172,62 @@ def is_text_node(obj):
     return obj.__class__.__name__ == 'NavigableString'
 
 
-def make_soup(source):
-    soup = BeautifulSoup(source, 'html.parser')
-    counter = [0]
+def available_parser(parser):
+    if parser is None:
+        return DEFAULT_PARSER
+    elif builder_registry.lookup(parser) is None:
+        verbose_print('Parser "{0}" is not installed; falling back to "{1}".'.format(parser, DEFAULT_PARSER))
+        return DEFAULT_PARSER
+    else:
+        return parser
 
-    def visit_node(node):
-        node.hq_doc_index = counter[0]
-        counter[0] += 1
-        if is_tag_node(node):
-            attr_names = sorted(node.attrs.keys(), key=lambda name: name.lower())
-            node.hq_attrs = [AttributeNode(name, node.attrs[name]) for name in attr_names]
-            for attr in node.hq_attrs:
-                visit_node(attr)
 
-    preorder_traverse_node_tree(soup, visit_node, filter=is_any_node)
-    verbose_print('Loaded HTML document containing {0} indexed nodes.'.format(counter[0]))
+def make_soup(source, parser=DEFAULT_PARSER):
+    soup = BeautifulSoup(source, available_parser(parser))
+    node_count = index_document(soup)
+    verbose_print('Loaded HTML document containing {0} indexed nodes.'.format(node_count))
     return soup
 
 
-def preorder_traverse_node_tree(node, fn, filter=lambda n: is_tag_node(n) or is_root_node(n)):
-    if filter(node):
-        fn(node)
-        if hasattr(node, 'hq_attrs') and _isnt_root_with_odd_ghost_hq_attrs_on_it_for_reasons_i_dont_understand(node):
-            for attr in node.hq_attrs:
-                preorder_traverse_node_tree(attr, fn, filter)
-        if hasattr(node, 'children'):
-            for child in node.children:
-                preorder_traverse_node_tree(child, fn, filter)
+def index_document(soup):
+    counter = 0
+    stack = [soup]
+
+    while stack:
+        node = stack.pop()
+        class_name = node.__class__.__name__
+        if class_name not in _indexed_node_classes:
+            continue
+
+        node.hq_doc_index = counter
+        counter += 1
+
+        if class_name == 'Tag':
+            # Attribute nodes are built on demand by AttributeNode.enumerate; just reserve their indexes here.
+            counter += len(node.attrs)
+            stack.extend(reversed(node.contents))
+        elif class_name == 'BeautifulSoup':
+            stack.extend(reversed(node.contents))
+
+    return counter
+
+
+def tag_name_index(soup):
+    index = soup.__dict__.get('hq_tag_name_index')
+
+    if index is None:
+        index = dict()
+        for node in soup.descendants:
+            if node.__class__.__name__ == 'Tag' and 'hq_doc_index' in node.__dict__:
+                entry = index.get(node.name.lower())
+                if entry is None:
+                    entry = index[node.name.lower()] = ([], [])
+                entry[0].append(node.hq_doc_index)
+                entry[1].append(node)
+        soup.hq_tag_name_index = index
+        verbose_print('Built tag name index covering {0} distinct tag names.'.format(len(index)))
+
+    return index
 
 
 def root_tag_from_any_tag(obj):
@@ -142,5 +244,74 @@ def soup_from_any_tag(obj):
     return obj
 
 
-def _isnt_root_with_odd_ghost_hq_attrs_on_it_for_reasons_i_dont_understand(node):
-    return node.hq_attrs is not None
+def _css_class_names(tag):
+    names = tag['class']
+    return names.split() if isinstance(names, str) else names
+
+
+def _descendants_in_index_entry(node, entry):
+    doc_indexes, nodes = entry
+    if is_root_node(node):
+        return list(nodes)
+
+    first = bisect_right(doc_indexes, node.hq_doc_index)
+    last = bisect_left(doc_indexes, _doc_index_following_subtree(node), lo=first)
+    return nodes[first:last]
+
+
+def _doc_index_following_subtree(node):
+    while node is not None:
+        sibling = node.next_sibling
+        while sibling is not None:
+            if 'hq_doc_index' in sibling.__dict__:
+                return sibling.hq_doc_index
+            sibling = sibling.next_sibling
+        node = node.parent
+    return float('inf')
+
+
+def _cached_text_from_tag(tag, preserve_space):
+    cache_key = 'hq_preserved_text' if preserve_space else 'hq_text'
+    result = tag.__dict__.get(cache_key)
+
+    if result is None:
+        _derived_text_cache_counts[1] += 1
+        strings = list(tag.strings)
+        result = u''.join(strings) if preserve_space else _normalize_whitespace(_join_stripped_runs(strings))
+        tag.__dict__[cache_key] = result
+    else:
+        _derived_text_cache_counts[0] += 1
+
+    return result
+
+
+def _join_stripped_runs(strings):
+    # Each non-blank string contributes its stripped run. A run is preceded by a space when the string it's matched
+    # to starts with whitespace, or the string before that one ends with it. A run is matched to the first string,
+    # starting from where the previous run was matched, that contains it, which isn't always the one it came from.
+    pieces = []
+    cursor = 0
+    for index, string in enumerate(strings):
+        run = string.strip()
+        if len(run) == 0:
+            continue
+        while cursor < index and run not in strings[cursor]:
+            cursor += 1
+        if strings[cursor][0].isspace() or (cursor > 0 and strings[cursor - 1][-1].isspace()):
+            pieces.append(' ')
+        pieces.append(run)
+    return u''.join(pieces)
+
+
+def _lowercase(name):
+    return name.lower()
+
+
+def _normalize_whitespace(text):
+    return _whitespace_run_pattern.sub(' ', text.replace(u'\u00a0', ' ')).strip()
+
+
+_empty_index_entry = ([], [])
+_whitespace_run_pattern = re.compile(r'\s+')
+_derived_text_cache_counts = [0, 0]
+_indexed_node_classes = {'BeautifulSoup', 'Comment', 'NavigableString', 'Tag'}
@@ -20,6 +20,21 @@ def pop_indent():
     indent_level -= 2
 
 
+def traced(fn, entry_message, exit_message):
+    """Decide at compile time whether fn is wrapped to print entry and exit messages; untouched if not verbose."""
+    if not settings.VERBOSE:
+        return fn
+
+    def traced_fn(*args):
+        verbose_print(lambda: entry_message(*args), indent_after=True)
+        result = fn(*args)
+        verbose_print(lambda: exit_message(result), outdent_before=True)
+        return result
+
+    traced_fn.__dict__.update(getattr(fn, '__dict__', {}))
+    return traced_fn
+
+
 def verbose_print(text, indent_after=False, outdent_before=False):
     if settings.VERBOSE:
         if outdent_before:
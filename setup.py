@@ -36,4 +36,5 @@ setup(name='hq',
       url='https://github.com/rbwinslow/hq',
       keywords='html xpath query xquery hquery jq cmdline cli',
       classifiers=classifiers,
-      install_requires=['beautifulsoup4', 'docopt', 'wheel'])
+      python_requires='>=3.8',
+      install_requires=['beautifulsoup4>=4.13', 'docopt', 'wheel'])
@@ -1,3 +1,4 @@
+import re
 from textwrap import dedent
 
 from hq.soup_util import make_soup
@@ -20,17 +21,26 @@ def expected_result(contents):
 def simulate_args_dict(**kwargs):
     args = {
         '<expression>': '',
+        '<input>': [],
+        '--encoding': 'utf-8',
+        '--explain': False,
         '-f': False,
         '--file': False,
+        '-j': False,
+        '--jobs': '1',
+        '--parser': 'html.parser',
+        '--output-buffer': '65536',
         '--preserve': False,
+        '--profile': False,
         '--program': '',
         '-u': False,
         '--ugly': False,
+        '--unordered': False,
         '-v': False,
         '--verbose': False
     }
     for key, value in kwargs.items():
-        if key == 'expression':
+        if key in ('expression', 'input'):
             format_string = '<{0}>'
         elif len(key) == 1:
             format_string = '-{0}'
@@ -46,3 +56,30 @@ def soup_with_body(contents):
 
 def wrap_html_body(contents):
     return u'<html><body>{0}</body></html>'.format(contents)
+
+
+def quadratic_derive_text_from_node(obj, preserve_space=False):
+    """The implementation derive_text_from_node replaced, kept as a reference for differential tests."""
+    result = u''
+    strings = list(obj.strings)
+    cursor = 0
+    for run in (strings if preserve_space else obj.stripped_strings):
+        if preserve_space:
+            add_space = False
+        else:
+            while cursor < len(strings):
+                if run in strings[cursor]:
+                    break
+                else:
+                    cursor += 1
+            if cursor < len(strings):
+                add_space = strings[cursor][0].isspace() or (cursor > 0 and strings[cursor - 1][-1].isspace())
+            else:
+                add_space = False
+        result += u'{0}{1}'.format(' ' if add_space else '', run)
+
+    if not preserve_space:
+        result = re.sub(u'\u00a0', ' ', result)
+        result = re.sub(r'\s+', ' ', result).strip()
+
+    return result
@@ -451,3 +451,30 @@ def test_css_class_axis_finds_elements_based_on_their_css_classes():
 def test_css_class_axis_can_only_be_followed_by_name_test():
     with raises(HquerySyntaxError):
         assert query_html_doc('', '/.::node()')
+
+
+def test_descendant_name_tests_from_nested_context_nodes_stay_within_the_subtree():
+    html_body = """
+    <section><p>one</p><div><p>two</p></div></section>
+    <p>three</p>"""
+    assert query_html_doc(html_body, '//section/descendant::p/text()') == expected_result("""
+    one
+    two""")
+    assert query_html_doc(html_body, '//div/descendant-or-self::div/p/text()') == 'two'
+    assert query_html_doc(html_body, 'count(/descendant::p)') == '3'
+
+
+def test_existence_tests_on_location_paths_agree_with_full_evaluation():
+    html_body = """
+    <section><p>one</p><div><p class="x">two</p></div></section>
+    <div><span>three</span></div>"""
+    assert query_html_doc(html_body, 'boolean(//p[@class])') == 'true'
+    assert query_html_doc(html_body, 'boolean(//section/following::p)') == 'false'
+    assert query_html_doc(html_body, 'not(//span/preceding::p[1])') == 'false'
+    assert query_html_doc(html_body, 'if (//div/p) then "yes" else "no"') == 'yes'
+    assert query_html_doc(html_body, 'boolean(//section/p and //nav)') == 'false'
+    assert query_html_doc(html_body, 'boolean(//nav or //div/span)') == 'true'
+    assert query_html_doc(html_body, 'let $s := //section return boolean($s//p[text() = "two"])') == 'true'
+    assert query_html_doc(html_body, '//div[p/@class]/p/text()') == 'two'
+    assert query_html_doc(html_body, '//div[preceding::p]/span/text()') == 'three'
+    assert query_html_doc(html_body, 'count(//*[descendant::p])') == '4'
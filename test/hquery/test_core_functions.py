@@ -58,6 +58,23 @@ def test_id_function_returns_node_set_where_node_ids_match_any_names_in_whitespa
     </p>""")
 
 
+def test_id_function_finds_the_root_element_and_every_element_sharing_an_id():
+    html = """
+    <html id="top">
+    <body>
+        <p id="dup">one</p>
+        <p id="dup">two</p>
+        <a href="#top">up</a>
+    </body>
+    </html>"""
+    assert query_html_doc(html, 'name(id("top"))', wrap_body=False) == 'html'
+    assert query_html_doc(html, 'id("dup")/text()', wrap_body=False) == expected_result("""
+    one
+    two""")
+    assert query_html_doc(html, 'for $a in //a return name(id(substring-after($a/@href, "#")))',
+                          wrap_body=False) == 'html'
+
+
 def test_id_function_crazy_use_case_where_id_values_are_derived_from_string_values_of_nodes_in_node_set():
     html_body = """
     <ul>
@@ -264,3 +281,21 @@ def test_various_functions_use_context_node_when_no_argument_passed():
     assert query_html_doc(html_body, '//p[normalize-space() = "foo bar"]/text()', preserve_space=True) == \
            expected_result('foo   bar')
     assert query_html_doc(html_body, '//p[string-length() = 4]/text()') == expected_result('last')
+
+
+def test_boolean_values_are_shared_singletons():
+    from hq.hquery.functions.core_boolean import boolean, true, false
+
+    assert boolean(1) is true()
+    assert boolean([]) is false()
+    assert not hasattr(true(), '__dict__')
+
+
+def test_small_integer_numbers_are_interned_and_arithmetic_still_yields_correct_values():
+    from hq.hquery.functions.core_number import number
+
+    assert number(7) is number('7.0')
+    assert number(number(2.5)).value == 2.5
+    assert (number(1000) + number(1000)).value == 2000
+    assert not hasattr(number(3), '__dict__')
+    assert query_html_doc('', 'sum(1 to 100)') == '5050'
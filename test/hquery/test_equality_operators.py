@@ -85,3 +85,39 @@ def test_equals_operator_works_with_node_sets_containing_attributes():
     <div id="one"></div>
     <div id="two"></div>"""
     assert query_html_doc(html_body, '//div/attribute::id = "two"') == expected_result('true')
+
+
+def test_predicates_comparing_context_nodes_with_a_context_free_node_set_select_the_same_nodes_either_way_around():
+    html_body = """
+    <ul>
+        <li data-sku="a1">one</li>
+        <li data-sku="b2">two</li>
+        <li data-sku="c3">three</li>
+    </ul>
+    <span data-sku="c3"></span>
+    <span data-sku="a1"></span>"""
+    expected = expected_result("""
+    <li data-sku="a1">
+     one
+    </li>
+    <li data-sku="c3">
+     three
+    </li>""")
+    assert query_html_doc(html_body, '//li[@data-sku = //span/@data-sku]') == expected
+    assert query_html_doc(html_body, '//li[//span/@data-sku = @data-sku]') == expected
+    assert query_html_doc(html_body, '//li[@data-sku != //span/@data-sku]') == expected_result("""
+    <li data-sku="b2">
+     two
+    </li>""")
+
+
+def test_predicates_comparing_context_nodes_with_variables_and_literals_use_the_fixed_value_for_every_node():
+    html_body = """
+    <p>foo</p>
+    <p>bar</p>
+    <p>foo</p>"""
+    assert query_html_doc(html_body, 'count(//p[text() = "foo"])') == expected_result('2')
+    assert query_html_doc(html_body, 'count(//p["bar" != text()])') == expected_result('2')
+    assert query_html_doc(html_body, 'let $x := "bar" return count(//p[. = $x])') == expected_result('1')
+    assert query_html_doc(html_body, 'count(//p[count(//p) = 3])') == expected_result('3')
+    assert query_html_doc(html_body, 'count(//p[string-length(string()) = 3][//p = "baz"])') == expected_result('0')
@@ -0,0 +1,56 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath('../..'))
+
+from hq.config import settings
+from hq.hquery.hquery_processor import clear_expression_cache, compile_hquery, expression_cache_info
+from hq.verbosity import set_verbosity
+from test.hquery.hquery_test_util import query_html_doc
+
+
+def test_repeated_queries_reuse_the_compiled_expression():
+    clear_expression_cache()
+
+    assert query_html_doc('<p>one</p>', '//p/text()') == 'one'
+    assert query_html_doc('<p>two</p>', '//p/text()') == 'two'
+
+    info = expression_cache_info()
+    assert info.misses == 1
+    assert info.hits == 1
+
+
+def test_cache_is_keyed_by_preserve_space_as_well_as_source():
+    clear_expression_cache()
+
+    assert compile_hquery('//p') is compile_hquery('//p', preserve_space=False)
+    assert compile_hquery('//p') is not compile_hquery('//p', preserve_space=True)
+
+
+def test_tracing_is_compiled_in_so_the_cache_is_keyed_by_verbosity(capsys):
+    verbose = settings.VERBOSE
+    clear_expression_cache()
+    try:
+        set_verbosity(False)
+        untraced = compile_hquery('2 * 3')
+        set_verbosity(True)
+        traced = compile_hquery('2 * 3')
+        assert traced is not untraced
+        capsys.readouterr()
+
+        assert untraced() == traced()
+        err = capsys.readouterr().err
+        assert err.count('(times) returning') == 1
+    finally:
+        set_verbosity(verbose)
+        clear_expression_cache()
+
+
+def test_interpolated_string_clauses_are_compiled_once():
+    clear_expression_cache()
+
+    query_html_doc('<p>foo</p>', '`${//p}`')
+    misses = expression_cache_info().misses
+    query_html_doc('<p>bar</p>', 'for $x in 1 to 3 return `${//p}`')
+
+    assert expression_cache_info().misses == misses + 1
@@ -14,6 +14,14 @@ def test_class_function_returns_true_when_element_has_name_in_class_attribute():
     assert query_html_doc(html_body, '//p[class("bar")]/text()') == 'expected'
 
 
+def test_class_function_returns_false_for_elements_without_a_class_attribute():
+    html_body = """
+    <p>no class</p>
+    <p class="foo">expected</p>"""
+    assert query_html_doc(html_body, '//p[class("foo")]/text()') == 'expected'
+    assert query_html_doc(html_body, 'class(//p[1], "foo")') == 'false'
+
+
 def test_even_and_odd_functions_select_the_appropriate_elements_based_on_position():
     html_body = """
     <p>You</p>
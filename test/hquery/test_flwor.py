@@ -1,6 +1,7 @@
+from hq.hquery.hquery_processor import HqueryProcessor, compile_hquery
 from hq.hquery.syntax_error import HquerySyntaxError
 from pytest import raises
-from test.common_test_util import expected_result
+from test.common_test_util import expected_result, soup_with_body
 from test.hquery.hquery_test_util import query_html_doc
 
 
@@ -165,3 +166,44 @@ def test_lack_of_return_at_end_of_flwor_is_a_syntax_error():
 
 def test_comma_can_be_used_to_declare_multiple_variables_in_a_let_clause():
     assert query_html_doc('', 'let $foo := "foo", $bar := "bar" return string-join(($foo, $bar), " ")') == 'foo bar'
+
+
+def test_lets_that_do_not_depend_on_the_iteration_variable_are_hoisted_out_of_the_loop():
+    flwor = compile_hquery('for $x in 1 to 3 let $all := //p let $n := $x + 1 let $c := count($all) return $n').__self__
+
+    assert [let[0] for let in flwor.invariant_variables] == ['all', 'c']
+    assert [let[0] for let in flwor.per_iteration_variables] == ['n']
+
+
+def test_hoisted_lets_produce_the_same_results_as_evaluating_them_in_every_iteration():
+    html_body = """
+    <p>one</p>
+    <p>two</p>"""
+    assert query_html_doc(html_body, 'for $x in //p let $all := //p return concat($x, "/", count($all))') == \
+        expected_result("""
+    one/2
+    two/2""")
+    assert query_html_doc('', 'for $x in 1 to 2 let $y := $x let $z := concat($y, "0") return $z') == expected_result("""
+    10
+    20""")
+    assert query_html_doc('', 'let $y := 5 for $x in 1 to 2 let $y := $x let $z := $y return $z') == \
+        expected_result("""
+    1
+    2""")
+    assert query_html_doc('', 'for $x in 1 to 2 let $x := 7 return $x') == expected_result("""
+    7
+    7""")
+    assert query_html_doc('', 'for $x in //nothing let $y := //p return $y') == ''
+
+
+def test_streamed_flwor_results_match_the_evaluated_sequence():
+    html_body = """
+    <p>one</p>
+    <p>two</p>"""
+    soup = soup_with_body(html_body)
+    hquery = 'let $all := //p for $p in $all return ($p/text(), count($all))'
+
+    streamed = HqueryProcessor(hquery).query_items(soup)
+
+    assert next(streamed).string == 'one'
+    assert [str(item) for item in streamed] == [str(item) for item in HqueryProcessor(hquery).query(soup)][1:]
@@ -191,3 +191,108 @@ def test_no_space_between_text_runs_crossing_element_boundaries_in_element_strin
     html_body = """<p>"<span>so-called</span>" Klingon  </p>"""
     assert query_html_doc(html_body, 'string(//p)') == '"so-called" Klingon'
     assert query_html_doc('<p>one <span>two</span></p>', 'string(//p)') == 'one two'
+
+
+def test_lazily_built_attribute_nodes_sort_into_document_order_with_elements():
+    html_body = '<div b="2" a="1"><p c="3">text</p></div>'
+    assert query_html_doc(html_body, '//div/@* | //p | //p/@c | //p/text()', wrap_body=True) == expected_result('''
+    a="1"
+    b="2"
+    <p c="3">
+     text
+    </p>
+    c="3"
+    text''')
+
+
+def test_double_slash_name_test_keeps_per_parent_positions_for_positional_predicates():
+    html_body = """
+    <div><p>one</p><p>two</p></div>
+    <div><p>three</p></div>"""
+    assert query_html_doc(html_body, '//p[1]/text()') == expected_result("""
+    one
+    three""")
+    assert query_html_doc(html_body, '//p[last()]/text()') == expected_result("""
+    two
+    three""")
+    assert query_html_doc(html_body, '//p[. != "two"]/text()') == expected_result("""
+    one
+    three""")
+
+
+def test_double_slash_steps_match_the_same_nodes_whether_or_not_they_are_fused():
+    html = """
+    <!-- before -->
+    <html class="top">
+        <body><p class="a" id="x">one<!-- inside --></p><div class="a"><p>two</p></div></body>
+    </html>"""
+    assert query_html_doc(html, 'count(//comment())', wrap_body=False) == '1'
+    assert query_html_doc(html, 'count(/descendant::comment())', wrap_body=False) == '2'
+    assert query_html_doc(html, '//@class', wrap_body=False) == expected_result('''
+    class="top"
+    class="a"
+    class="a"''')
+    assert query_html_doc(html, 'count(//class::a)', wrap_body=False) == '2'
+    assert query_html_doc(html, '//div//p/text()', wrap_body=False) == 'two'
+    assert query_html_doc(html, 'count(//html)', wrap_body=False) == '1'
+
+
+def test_nodes_reached_from_overlapping_contexts_come_back_once_in_document_order():
+    html_body = """
+    <div id="outer">
+        <p>one</p>
+        <div id="inner"><p>two</p></div>
+        <p>three</p>
+    </div>
+    <p>four</p>"""
+    assert query_html_doc(html_body, '//div/descendant::p/text()') == expected_result("""
+    one
+    two
+    three""")
+    assert query_html_doc(html_body, '//p/preceding::p/text()') == expected_result("""
+    one
+    two
+    three""")
+    assert query_html_doc(html_body, '//p/ancestor::div/@id') == expected_result('''
+    id="outer"
+    id="inner"''')
+
+
+def test_literal_and_last_positional_predicates_select_the_same_nodes_as_position_comparisons():
+    html_body = """
+    <div>
+        <p class="a">one</p>
+        <p>two</p>
+        <p class="a">three</p>
+    </div>
+    <div>
+        <p>four</p>
+    </div>"""
+    assert query_html_doc(html_body, '//div/p[1]/text()') == expected_result("""
+    one
+    four""")
+    assert query_html_doc(html_body, '//div/p[last()]/text()') == expected_result("""
+    three
+    four""")
+    assert query_html_doc(html_body, '//p[@class][2]/text()') == 'three'
+    assert query_html_doc(html_body, '//p[3][@class]/text()') == 'three'
+    assert query_html_doc(html_body, '//p[text() = "four"]/preceding::p[1]/text()') == 'three'
+    assert query_html_doc(html_body, '//p[text() = "four"]/preceding::p[last()]/text()') == 'one'
+    assert query_html_doc(html_body, 'count(//div/p[0])') == '0'
+    assert query_html_doc(html_body, 'count(//div/p[1.5])') == '0'
+    assert query_html_doc(html_body, 'count(//div/p[4])') == '0'
+
+
+def test_fused_double_slash_steps_with_leading_positional_predicates_pick_per_parent():
+    html = """
+    <!-- before -->
+    <html>
+        <body><p class="a">one</p><div><p>two</p><p class="a">three</p></div><p class="a">four</p></body>
+    </html>"""
+    for step in ('*[1]', 'p[last()]', 'p[2][@class]', 'class::a[1]', 'node()[last()]'):
+        fused = query_html_doc(html, '//{0}'.format(step), wrap_body=False)
+        unfused = query_html_doc(html, '/descendant-or-self::node()[true()]/{0}'.format(step), wrap_body=False)
+        assert fused == unfused
+    assert query_html_doc(html, '//p[2][@class]/text()', wrap_body=False) == expected_result("""
+    three
+    four""")
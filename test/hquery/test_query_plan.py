@@ -0,0 +1,73 @@
+from hq.hquery.hquery_processor import HqueryProcessor
+from test.common_test_util import expected_result
+
+
+def explain(hquery):
+    return str(HqueryProcessor(hquery).explain())
+
+
+def test_plan_shows_steps_with_their_axes_node_tests_and_predicates():
+    assert explain('/html/body/p[@id]') == expected_result("""
+    absolute location path
+      step 1: child::html
+      step 2: child::body
+      step 3: child::p
+        predicate 1
+          [rewrite] location path only tested for existence; it stops at the first node it finds
+          relative location path
+            step 1: attribute::id""")
+
+
+def test_plan_reports_fused_steps_index_lookups_and_position_selection():
+    assert explain('//tr[1]/td[last()]') == expected_result("""
+    absolute location path
+      step 1: child::tr
+        [rewrite] fused with the descendant_or_self::node() step before it
+        [rewrite] nodes looked up in the document's tag name index instead of walking the axis
+        predicate 1
+          [rewrite] position picked among each parent's children, not evaluated for each node
+          (literal-number 1)
+      step 2: child::td
+        predicate 1
+          [rewrite] position picked directly, not evaluated for each node
+          (function call "last")""")
+
+
+def test_plan_reports_hash_joins_and_context_free_predicates():
+    plan = explain('//tr[@data-sku = //span/@data-sku][count(//p) > 1]')
+    assert 'predicate 1\n      [rewrite] hash join; the context-free side of "=" is evaluated' in plan
+    assert 'predicate 2\n      [rewrite] context free, so evaluated once per step instead of once per node' in plan
+
+
+def test_plan_shows_flwor_clauses_in_evaluation_order_with_hoisted_lets():
+    assert explain('for $x in 1 to 2 let $y := $x + 1 let $z := 3 return $y') == expected_result("""
+    FLWOR
+      for $x in
+        (range-operator)
+          (literal-number 1)
+          (literal-number 2)
+      let $z :=
+        [rewrite] loop invariant, so hoisted out of the loop and evaluated once
+        (literal-number 3)
+      let $y :=
+        (plus)
+          (variable $x)
+          (literal-number 1)
+      return
+        (variable $y)""")
+
+
+def test_plan_shows_union_decomposition_clauses_and_flattened_sequences():
+    assert explain('(1, 2, 3) => . | "x"') == expected_result("""
+    union decomposition
+      union
+        (comma)
+          [rewrite] nested sequences flattened, so all 3 operands are gathered into one list
+          (literal-number 1)
+          (literal-number 2)
+          (literal-number 3)
+      clause 1
+        relative location path
+          step 1: self::node()
+      clause 2
+        (literal-string "x")""")
@@ -47,3 +47,25 @@ def test_string_value_of_a_sequence_is_concatenation_of_all_items_unlike_node_se
 
     assert query_html_doc(html_body, 'let $_ := //p/text() return string($_)') == 'one'
     assert query_html_doc(html_body, 'let $_ := ("one", "two") return string($_)') == 'onetwo'
+
+
+def test_sequence_built_from_a_node_set_variable_leaves_the_variable_alone():
+    html_body = '<p>one</p><p>two</p>'
+    assert query_html_doc(html_body, 'let $x := //p return (count(($x, $x)), count($x), count($x | $x))') == \
+        expected_result("""
+    4
+    2
+    2""")
+
+
+def test_sequence_built_from_a_sequence_variable_leaves_the_variable_alone():
+    assert query_html_doc('', 'let $a := (1, 2) return (($a, 3), count($a))') == expected_result("""
+    1
+    2
+    3
+    2""")
+
+
+def test_long_comma_separated_sequences_keep_their_order():
+    items = [str(n) for n in range(1, 51)]
+    assert query_html_doc('', ', '.join(items)) == expected_result('\n'.join(items))
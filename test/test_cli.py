@@ -1,12 +1,18 @@
+import json
+import os
 import re
 
+import pytest
+from docopt import DocoptExit
+
 try:
     from mock import mock_open
 except ImportError:
     from unittest.mock import mock_open
 
 from hq.hq import main
-from test.common_test_util import simulate_args_dict, wrap_html_body, capture_console_output
+from hq.profiling import set_profiling
+from test.common_test_util import simulate_args_dict, wrap_html_body, capture_console_output, expected_result
 
 
 def test_preserve_space_flag_turns_off_space_normalization(capsys, mocker):
@@ -50,6 +56,92 @@ def test_ugly_flag_preserves_markup_formatting(capsys, mocker):
     assert actual == expected
 
 
+def test_encoding_option_selects_the_codec_for_printed_results(capsysbinary, mocker):
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='//p/text()', encoding='latin-1')
+    mocker.patch('sys.stdin.read').return_value = wrap_html_body(u'<p>caf\xe9</p>')
+
+    main()
+
+    actual, _ = capsysbinary.readouterr()
+    assert actual == b'caf\xe9\n'
+
+
+def test_unknown_encoding_is_rejected_before_input_is_read(mocker):
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='//p', encoding='no-such-codec')
+    read = mocker.patch('sys.stdin.read')
+
+    with pytest.raises(DocoptExit) as error:
+        main()
+
+    assert '--encoding must name a known codec' in str(error.value)
+    assert not read.called
+
+
+def test_output_buffer_option_must_be_a_non_negative_integer(mocker):
+    read = mocker.patch('sys.stdin.read')
+
+    for size in ('abc', '-1'):
+        mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='//p', **{'output-buffer': size})
+        with pytest.raises(DocoptExit) as error:
+            main()
+        assert '--output-buffer must be a non-negative integer' in str(error.value)
+
+    assert not read.called
+
+
+def test_results_the_encoding_cannot_represent_produce_an_output_error(capsys, mocker):
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='//p/text()', encoding='ascii')
+    mocker.patch('sys.stdin.read').return_value = wrap_html_body(u'<p>caf\xe9</p>')
+
+    main()
+
+    _, errors = capture_console_output(capsys)
+    assert errors.startswith('OUTPUT ERROR')
+
+
+def test_lookup_errors_raised_while_evaluating_are_not_reported_as_output_errors(capsys, mocker):
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='//p')
+    mocker.patch('sys.stdin.read').return_value = wrap_html_body('<p>foo</p>')
+    mocker.patch('hq.hq.HqueryProcessor.query_items').side_effect = KeyError('evaluator bug')
+
+    with pytest.raises(KeyError):
+        main()
+
+    _, errors = capture_console_output(capsys)
+    assert 'OUTPUT ERROR' not in errors
+
+
+def test_profile_flag_prints_a_profile_report_after_the_results(capsys, mocker):
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='count(//p)', profile=True)
+    mocker.patch('sys.stdin.read').return_value = wrap_html_body('<p>one</p><p>two</p>')
+
+    try:
+        main()
+    finally:
+        set_profiling(False)
+
+    output, errors = capture_console_output(capsys)
+    assert output == '2'
+    assert errors.startswith('PROFILE')
+    assert re.search(r'\b1\s+1\s+function\s+count\(<expr>\)', errors)
+
+
+def test_explain_flag_prints_the_query_plan_without_reading_input(capsys, mocker):
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='count(//p)', explain=True)
+    read = mocker.patch('sys.stdin.read')
+
+    main()
+
+    output, _ = capture_console_output(capsys)
+    assert output == expected_result("""
+    (function call "count")
+      absolute location path
+        step 1: child::p
+          [rewrite] fused with the descendant_or_self::node() step before it
+          [rewrite] nodes looked up in the document's tag name index instead of walking the axis""")
+    assert not read.called
+
+
 def test_syntax_error_prints_proper_error_message(capsys, mocker):
     mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='child:://')
     mocker.patch('sys.stdin.read').return_value = wrap_html_body('')
@@ -70,6 +162,19 @@ def test_query_error_prints_proper_error_message(capsys, mocker):
     assert re.match(r'^query error.+unknown function.+no-such-function', actual.lower())
 
 
+def test_top_level_sequence_results_are_written_before_a_later_item_fails(capsys, mocker):
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='for $x in (1, 2) return $x, no-such-function()')
+    mocker.patch('sys.stdin.read').return_value = wrap_html_body('')
+
+    main()
+
+    output, errors = capture_console_output(capsys)
+    assert output == expected_result("""
+    1
+    2""")
+    assert re.match(r'^query error.+unknown function.+no-such-function', errors.lower())
+
+
 def test_reading_input_from_a_file_instead_of_stdin(capsys, mocker):
     expected_filename = 'filename.html'
     mocked_open = mock_open(read_data=wrap_html_body('<p>foo</p>'))
@@ -100,3 +205,103 @@ def test_program_flag_reads_hquery_program_from_file(capsys, mocker):
     actual, _ = capture_console_output(capsys)
     mocked_open.assert_called_with(expected_filename)
     assert actual == 'foo'
+
+
+def test_input_arguments_run_query_against_each_file_and_print_ndjson_records(capsys, mocker, tmpdir):
+    first = tmpdir.join('first.html')
+    first.write(wrap_html_body('<p>one</p><p>two</p>'))
+    second = tmpdir.join('second.html')
+    second.write(wrap_html_body('<p>three</p>'))
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(
+        expression='//p/text()', input=[str(first), str(second)])
+
+    main()
+
+    actual, _ = capture_console_output(capsys)
+    records = [json.loads(line) for line in actual.split('\n')]
+    assert records == [{'input': str(first), 'results': ['one', 'two']},
+                       {'input': str(second), 'results': ['three']}]
+
+
+def test_directory_and_glob_inputs_are_expanded_in_sorted_order(capsys, mocker, tmpdir):
+    tmpdir.mkdir('pages')
+    for name in ('b.html', 'a.html'):
+        tmpdir.join('pages', name).write(wrap_html_body('<p>{0}</p>'.format(name)))
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(
+        expression='//p/text()', input=[str(tmpdir.join('pages')), str(tmpdir.join('pages', '*.html'))])
+
+    main()
+
+    actual, _ = capture_console_output(capsys)
+    inputs = [os.path.basename(json.loads(line)['input']) for line in actual.split('\n')]
+    assert inputs == ['a.html', 'b.html', 'a.html', 'b.html']
+
+
+def test_batch_mode_reports_per_input_errors_and_keeps_going(capsys, mocker, tmpdir):
+    good = tmpdir.join('good.html')
+    good.write(wrap_html_body('<p>foo</p>'))
+    missing = str(tmpdir.join('missing.html'))
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='//p/text()', input=[missing, str(good)])
+
+    main()
+
+    actual, _ = capture_console_output(capsys)
+    records = [json.loads(line) for line in actual.split('\n')]
+    assert records[0]['input'] == missing
+    assert records[0]['error'].startswith('INPUT ERROR')
+    assert records[1] == {'input': str(good), 'results': ['foo']}
+
+
+def test_jobs_option_queries_inputs_in_worker_processes_preserving_input_order(capsys, mocker, tmpdir):
+    paths = []
+    for index in range(6):
+        page = tmpdir.join('page{0}.html'.format(index))
+        page.write(wrap_html_body('<p>{0}</p>'.format(index)))
+        paths.append(str(page))
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='//p/text()', input=paths, jobs='3')
+
+    main()
+
+    actual, _ = capture_console_output(capsys)
+    records = [json.loads(line) for line in actual.split('\n')]
+    assert records == [{'input': path, 'results': [str(index)]} for index, path in enumerate(paths)]
+
+
+def test_jobs_option_must_be_a_positive_integer(mocker, tmpdir):
+    page = tmpdir.join('page.html')
+    page.write(wrap_html_body('<p>foo</p>'))
+    query_files = mocker.patch('hq.hq.query_files')
+
+    for jobs in ('x', '0', '-2'):
+        mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='//p', input=[str(page)], jobs=jobs)
+        with pytest.raises(DocoptExit) as error:
+            main()
+        assert '--jobs must be a positive integer' in str(error.value)
+
+    assert not query_files.called
+
+
+def test_unordered_flag_still_yields_one_record_per_input(capsys, mocker, tmpdir):
+    paths = []
+    for index in range(4):
+        page = tmpdir.join('page{0}.html'.format(index))
+        page.write(wrap_html_body('<p>{0}</p>'.format(index)))
+        paths.append(str(page))
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(
+        expression='//p/text()', input=paths, jobs='2', unordered=True)
+
+    main()
+
+    actual, _ = capture_console_output(capsys)
+    records = [json.loads(line) for line in actual.split('\n')]
+    assert sorted(records, key=lambda r: r['input']) == [{'input': path, 'results': [str(index)]}
+                                                          for index, path in enumerate(paths)]
+
+
+def test_parser_option_selects_tree_builder_and_falls_back_when_missing(capsys, mocker):
+    mocker.patch('sys.stdin.read').return_value = wrap_html_body('<p>foo</p>')
+
+    mocker.patch('hq.hq.docopt').return_value = simulate_args_dict(expression='//p/text()', parser='no-such-parser')
+    main()
+    actual, _ = capture_console_output(capsys)
+    assert actual == 'foo'
@@ -0,0 +1,71 @@
+from io import BytesIO
+
+from bs4.element import Tag
+
+from hq.output import ResultWriter, convert_results_to_output_text, markup_to_text
+from hq.soup_util import make_soup
+from test.common_test_util import soup_with_body
+
+
+class RecordingStream(BytesIO):
+    def __init__(self):
+        super(RecordingStream, self).__init__()
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super(RecordingStream, self).write(data)
+
+
+def write_results(results, **kwargs):
+    stream = RecordingStream()
+    writer = ResultWriter(stream, **kwargs)
+    writer.write_all(results)
+    writer.finish()
+    return stream
+
+
+def test_result_writer_produces_the_same_text_as_printing_the_converted_results():
+    soup = soup_with_body(u'<p>caf\xe9</p><p>two</p>')
+    results = soup.find_all('p') + [u'three', 4.5]
+
+    for pretty in (True, False):
+        expected = convert_results_to_output_text(results, pretty=pretty) + u'\n'
+        assert write_results(results, pretty=pretty).getvalue().decode('utf-8') == expected
+
+    assert write_results([]).getvalue() == b'\n'
+
+
+def test_result_writer_encodes_output_with_the_requested_codec():
+    assert write_results([u'caf\xe9'], encoding='latin-1').getvalue() == b'caf\xe9\n'
+    assert write_results([u'caf\xe9'], encoding='utf-8').getvalue() == b'caf\xc3\xa9\n'
+
+
+def test_result_writer_collects_output_until_its_buffer_fills():
+    results = [u'one', u'two', u'three']
+
+    assert write_results(results).writes == 1
+    assert write_results(results, buffer_size=0).writes == len(results) + 1
+    assert write_results(results, buffer_size=8).writes == 2
+
+
+def test_markup_serializer_matches_beautiful_soup_output_in_both_modes():
+    soup = make_soup(u"""<!DOCTYPE html>
+    <html><head><meta charset="latin-1"><style>a > b { content: "&" }</style></head><body>
+    <p class="a b" id=x data-q='say "hi"' data-r="it's &amp; &quot;" hidden>x &amp; &lt; <b>y</b> z<br><img src=a.png>
+    <pre>  a
+     <i>b</i> </pre><script>if (a<b && c) x</script><!-- c --><textarea>  t <b> </textarea></p><p></p><p>  </p>
+    </body></html>""")
+
+    for node in [soup] + soup.find_all(True):
+        assert markup_to_text(node, pretty=True) == node.prettify().rstrip(' \t\n')
+        assert markup_to_text(node, pretty=False) == str(node)
+
+
+def test_markup_serializer_does_not_fall_back_on_beautiful_soup_for_html(mocker):
+    soup = soup_with_body(u'<p class="a">one <b>two</b></p>')
+    expected = [(node.prettify().rstrip(' \t\n'), str(node)) for node in [soup] + soup.find_all(True)]
+    mocker.patch.object(Tag, 'decode', side_effect=AssertionError('serialized through Tag.decode'))
+
+    assert [(markup_to_text(node, pretty=True), markup_to_text(node, pretty=False))
+            for node in [soup] + soup.find_all(True)] == expected
@@ -0,0 +1,62 @@
+from io import StringIO
+
+from hq.hquery.hquery_processor import HqueryProcessor
+from hq.profiling import print_profile_report, profile_entries, reset_profile, set_profiling
+from test.common_test_util import soup_with_body
+from test.hquery.hquery_test_util import query_html_doc
+
+
+def profile_query(html_body, hquery):
+    set_profiling(True)
+    reset_profile()
+    try:
+        query_html_doc(html_body, hquery)
+    finally:
+        set_profiling(False)
+    return dict(((entry.kind, entry.describe()), entry) for entry in profile_entries if entry.calls > 0)
+
+
+def test_steps_and_predicates_count_calls_and_nodes_in_and_out():
+    entries = profile_query('<p>1</p><p>2</p><p>3</p>', '/html/body/p[. > 1]')
+
+    step = entries[('step', 'child::p[predicate] of /child::html/child::body/child::p[predicate]')]
+    assert (step.calls, step.nodes_in, step.nodes_out) == (1, 1, 2)
+    predicate = entries[('predicate', '#1 of child::p[predicate] of /child::html/child::body/child::p[predicate]')]
+    assert (predicate.calls, predicate.nodes_in, predicate.nodes_out) == (1, 3, 2)
+    assert predicate.self_time <= predicate.cumulative_time <= step.cumulative_time
+
+
+def test_function_calls_and_flwor_clauses_are_profiled():
+    entries = profile_query('<p>1</p><p>2</p>',
+                            'for $x in 1 to 3 let $p := //p return count($p)')
+
+    kinds = dict((kind, entry) for (kind, _), entry in entries.items())
+    assert kinds['for'].calls == 1
+    assert kinds['for'].nodes_out == 3
+    assert kinds['let'].calls == 1
+    assert kinds['return'].calls == 3
+    assert kinds['function'].calls == 3
+    assert entries[('function', 'count(<expr>)')].nodes_out == 3
+
+
+def test_profiled_flwor_return_clauses_still_stream_their_items():
+    hquery = 'for $x in (1, 2) return ($x, no-such-function())'
+    set_profiling(True)
+    try:
+        streamed = HqueryProcessor(hquery).query_items(soup_with_body(''))
+        assert next(streamed) == 1
+    finally:
+        set_profiling(False)
+
+
+def test_report_ranks_entries_that_ran_by_self_time():
+    entries = profile_query('<p>1</p><p>2</p>', 'count(//p)')
+    report = StringIO()
+
+    print_profile_report(report)
+
+    lines = report.getvalue().splitlines()
+    assert lines[0].startswith('PROFILE')
+    assert len(lines) == 2 + len(entries)
+    self_times = [float(line.split()[0]) for line in lines[2:]]
+    assert self_times == sorted(self_times, reverse=True)
@@ -0,0 +1,148 @@
+import random
+
+import pytest
+from bs4 import BeautifulSoup
+
+from hq.soup_util import make_soup, available_parser, DEFAULT_PARSER, root_tag_from_soup, AttributeNode, \
+    descendants_by_css_class, descendants_by_tag_name, derive_text_from_node, derived_text_cache_info, \
+    forget_derived_text, has_css_class, is_tag_node
+from test.common_test_util import quadratic_derive_text_from_node
+
+
+def random_mixed_content(rnd, depth=0):
+    pieces = []
+    for _ in range(rnd.randint(0, 5)):
+        choice = rnd.random()
+        if choice < 0.5 or depth > 3:
+            pieces.append(rnd.choice(_text_fragments))
+        elif choice < 0.6:
+            pieces.append('<!-- {0} -->'.format(rnd.choice(_text_fragments)))
+        else:
+            tag = rnd.choice(('b', 'i', 'span', 'div', 'p'))
+            pieces.append('<{0}>{1}</{0}>'.format(tag, random_mixed_content(rnd, depth + 1)))
+    return ''.join(pieces)
+
+
+_text_fragments = ('one', ' two', 'three ', ' four ', 'one two', '  ', '\n\t', '&nbsp;', 'x&nbsp;y', ' y', 'x y',
+                   'lorem ipsum ', 'ipsum', '\u00a0tail')
+
+
+def test_parser_falls_back_to_default_when_not_installed():
+    assert available_parser('no-such-parser') == DEFAULT_PARSER
+    assert available_parser(None) == DEFAULT_PARSER
+
+    soup = make_soup('<html><body><p>foo</p></body></html>', parser='no-such-parser')
+    assert soup.p.string == 'foo'
+
+
+def test_installed_parser_backend_is_used_and_indexed():
+    pytest.importorskip('lxml')
+
+    soup = make_soup('<p id="x">foo', parser='lxml')
+
+    root = root_tag_from_soup(soup)
+    assert root.name == 'html'
+    assert soup.p.hq_doc_index > root.hq_doc_index
+    assert [attr.name for attr in AttributeNode.enumerate(soup.p)] == ['id']
+
+
+def test_deeply_nested_documents_index_without_hitting_recursion_limit():
+    depth = 3000
+    soup = make_soup('<html><body>{0}leaf{1}</body></html>'.format('<div>' * depth, '</div>' * depth))
+
+    innermost = soup.find(string='leaf')
+    assert innermost.hq_doc_index > innermost.parent.hq_doc_index > soup.body.hq_doc_index
+
+
+def test_attribute_nodes_are_indexed_after_their_element_in_name_order_and_before_its_children():
+    soup = make_soup('<html><body><p Zeta="z" alpha="a"><b>x</b></p></body></html>')
+
+    attrs = AttributeNode.enumerate(soup.p)
+    assert [attr.name for attr in attrs] == ['alpha', 'zeta']
+    assert soup.p.hq_doc_index < attrs[0].hq_doc_index < attrs[1].hq_doc_index < soup.b.hq_doc_index
+
+
+def test_attribute_nodes_are_materialized_on_first_access_and_then_reused():
+    soup = make_soup('<html><body><p b="2" a="1">x</p><i c="3"></i></body></html>')
+    assert 'hq_attrs' not in soup.p.__dict__
+
+    attrs = AttributeNode.enumerate(soup.p)
+
+    assert AttributeNode.enumerate(soup.p) is attrs
+    assert [attr.hq_doc_index for attr in attrs] == [soup.p.hq_doc_index + 1, soup.p.hq_doc_index + 2]
+    assert attrs[-1].hq_doc_index < soup.p.string.hq_doc_index
+    assert 'hq_attrs' not in soup.i.__dict__
+
+
+def test_tag_name_index_finds_same_descendants_as_walking_the_tree():
+    soup = make_soup('''
+    <html><body>
+        <div id="a"><p>1</p><div id="b"><p>2</p><span><p>3</p></span></div><p>4</p></div>
+        <p>5</p><div id="c"></div>
+    </body></html>''')
+
+    for node in [soup] + soup.find_all(True):
+        for name in ('p', 'div', 'span', 'body', 'table'):
+            expected = [tag for tag in node.descendants if getattr(tag, 'name', None) == name]
+            assert descendants_by_tag_name(node, name) == expected
+
+
+def test_tag_name_index_is_unavailable_for_documents_make_soup_did_not_index():
+    tag = BeautifulSoup('<div><p>x</p></div>', 'html.parser').div
+    assert descendants_by_tag_name(tag, 'p') is None
+
+
+def test_css_class_index_finds_same_descendants_and_memberships_as_walking_the_tree():
+    soup = make_soup('''
+    <html><body class="page">
+        <div class="a b"><p class="b">1</p><div class="a"><p class="b b c">2</p><span><p>3</p></span></div></div>
+        <p class="c">5</p><div></div>
+    </body></html>''')
+
+    for node in [soup] + soup.find_all(True):
+        for name in ('a', 'b', 'c', 'page', 'missing'):
+            expected = [tag for tag in node.descendants if is_tag_node(tag) and name in tag.get('class', [])]
+            actual = descendants_by_css_class(node, name)
+            assert [id(tag) for tag in actual] == [id(tag) for tag in expected]
+            if is_tag_node(node):
+                assert has_css_class(node, name) == (name in node.get('class', []))
+
+
+def test_css_class_membership_falls_back_to_the_attribute_for_unindexed_tags():
+    tag = BeautifulSoup('<div class="x y"><p>x</p></div>', 'html.parser').div
+    assert descendants_by_css_class(tag, 'x') is None
+    assert has_css_class(tag, 'y')
+    assert not has_css_class(tag.p, 'y')
+
+
+def test_string_value_derivation_matches_reference_implementation_on_mixed_content():
+    rnd = random.Random(0)
+    for _ in range(500):
+        soup = make_soup('<html><body>{0}</body></html>'.format(random_mixed_content(rnd)))
+        for node in [soup] + soup.find_all(True):
+            for preserve_space in (False, True):
+                expected = quadratic_derive_text_from_node(node, preserve_space=preserve_space)
+                assert derive_text_from_node(node, preserve_space=preserve_space) == expected
+
+
+def test_string_value_derivation_keeps_spacing_between_runs_and_converts_nbsp():
+    soup = make_soup('<html><body><p>one <b>two</b>three<i> four</i>&nbsp;five\n six</p></body></html>')
+    assert derive_text_from_node(soup.p) == 'one twothree four five six'
+    assert derive_text_from_node(soup.p, preserve_space=True) == u'one twothree four\u00a0five\n six'
+
+
+def test_derived_text_is_cached_per_node_and_space_mode_until_forgotten():
+    soup = make_soup('<html><body><div><p>one <b>two</b></p></div></body></html>')
+    before = derived_text_cache_info()
+
+    assert derive_text_from_node(soup.p) == 'one two'
+    assert derive_text_from_node(soup.p) == 'one two'
+    assert derive_text_from_node(soup.p, preserve_space=True) == 'one two'
+    assert derived_text_cache_info().hits - before.hits == 1
+    assert derived_text_cache_info().misses - before.misses == 2
+
+    derive_text_from_node(soup.div)
+    soup.b.append(' three')
+    forget_derived_text(soup.b)
+    assert derive_text_from_node(soup.p) == 'one two three'
+    assert derive_text_from_node(soup.div) == 'one two three'